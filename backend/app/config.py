@@ -1,6 +1,7 @@
 """Application configuration."""
 from pydantic_settings import BaseSettings
 from pathlib import Path
+from typing import Optional
 
 
 class Settings(BaseSettings):
@@ -20,12 +21,73 @@ class Settings(BaseSettings):
     TEMP_DIR: Path = Path("temp")
     COMPRESSED_DIR: Path = Path("compressed")
     
+    # Scratch Space Settings
+    SCRATCH_TMPFS_DIR: Optional[Path] = Path("/dev/shm/file-compressor")  # RAM-backed staging; None to disable
+    SCRATCH_TMPFS_MAX_JOB_BYTES: int = 64 * 1024 * 1024  # larger jobs stage in TEMP_DIR
+    SCRATCH_TMPFS_MAX_BYTES: int = 512 * 1024 * 1024
+    SCRATCH_SPACE_FACTOR: float = 2.0  # scratch bytes needed per input byte
+    SCRATCH_MIN_FREE_BYTES: int = 512 * 1024 * 1024  # headroom kept free on disk
+    SCRATCH_ORPHAN_AGE: int = 6 * 60 * 60  # age after which unattributable temp files are swept
+    
+    # Resumable Upload Settings
+    UPLOAD_MAX_CHUNK_SIZE: int = 16 * 1024 * 1024
+    UPLOAD_PROBE_BYTES: int = 1024 * 1024  # inspect files once this much has arrived
+    UPLOAD_SESSION_TTL: int = 24 * 60 * 60
+    
+    # FFmpeg Streaming Settings
+    MAX_CONCURRENT_STREAMS: int = 4
+    STREAM_BUFFER_BYTES: int = 4 * 1024 * 1024  # in-memory output buffer per stream
+    STREAM_PROBE_BYTES: int = 1024 * 1024  # bytes to scan for an MP4 'moov' box
+    
+    # Image Variant Settings
+    VARIANT_ENCODE_THREADS: int = 2  # parallel encodes per variants job, each taking a scheduler slot
+    
+    # Animated Image Settings
+    ANIMATION_FORMAT_SWITCH_RATIO: float = 0.7  # switch format only if at most this fraction of the size
+    ANIMATION_MAX_PIXELS: int = 100_000_000  # decoded pixels across distinct frames (4 bytes each)
+    
+    # Estimation Settings
+    ESTIMATE_SAMPLE_SECONDS: float = 2.0  # length of each media sample encode
+    ESTIMATE_SAMPLE_WINDOWS: int = 2
+    
+    # Storage Settings
+    STORAGE_BACKEND: str = "local"  # "local" or "s3"
+    S3_BUCKET: str = "file-compressor"
+    S3_ENDPOINT_URL: Optional[str] = None  # e.g. http://localhost:9000 for MinIO
+    S3_REGION: Optional[str] = None
+    S3_ACCESS_KEY_ID: Optional[str] = None
+    S3_SECRET_ACCESS_KEY: Optional[str] = None
+    S3_MAX_POOL_CONNECTIONS: int = 32
+    S3_MULTIPART_CHUNK_SIZE: int = 8 * 1024 * 1024
+    S3_TRANSFER_CONCURRENCY: int = 4
+    S3_PRESIGNED_URL_EXPIRY: int = 3600
+    
     # Supported file types
     SUPPORTED_IMAGE_FORMATS: set[str] = {"jpg", "jpeg", "png", "gif", "bmp", "webp", "tiff"}
     SUPPORTED_VIDEO_FORMATS: set[str] = {"mp4", "avi", "mov", "mkv", "flv", "wmv", "webm"}
     SUPPORTED_AUDIO_FORMATS: set[str] = {"mp3", "wav", "flac", "aac", "ogg", "m4a"}
     SUPPORTED_DOCUMENT_FORMATS: set[str] = {"pdf", "docx"}
     
+    # Scheduler Settings (job cost is estimated in seconds)
+    SCHEDULER_CLASS_CONCURRENCY: dict[str, int] = {"small": 4, "medium": 2, "large": 1}
+    SCHEDULER_MAX_QUEUED: dict[str, int] = {"small": 64, "medium": 16, "large": 8}
+    SCHEDULER_SMALL_JOB_COST: float = 2.0
+    SCHEDULER_LARGE_JOB_COST: float = 30.0
+    
+    # Distributed Worker Settings
+    QUEUE_BACKEND: str = "sqlite"  # "sqlite" or "redis"
+    QUEUE_SQLITE_PATH: Path = Path("jobs.db")
+    QUEUE_REDIS_URL: str = "redis://localhost:6379/0"
+    QUEUE_MAX_PENDING: int = 1000
+    JOB_LEASE_SECONDS: float = 60.0
+    JOB_MAX_ATTEMPTS: int = 3
+    WORKER_POLL_INTERVAL: float = 1.0
+    
+    # Rate Limiting (per client)
+    RATE_LIMIT_PER_MINUTE: int = 60  # 0 disables rate limiting
+    RATE_LIMIT_BURST: int = 10
+    TRUSTED_PROXIES: set[str] = set()  # peers allowed to set X-Client-ID
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
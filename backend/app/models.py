@@ -1,5 +1,5 @@
 """Data models for the application."""
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from enum import Enum
 from typing import Optional
 
@@ -19,12 +19,25 @@ class FileType(str, Enum):
     DOCUMENT = "document"
 
 
+class JobStatus(str, Enum):
+    """Lifecycle states of a queued compression job."""
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
 class CompressionRequest(BaseModel):
     """Compression request model."""
     strategy: CompressionStrategy
     target_size_mb: Optional[float] = Field(None, gt=0, description="Target size in MB")
     reduction_percentage: Optional[int] = Field(None, ge=1, le=99, description="Percentage to reduce")
     quality: Optional[int] = Field(None, ge=1, le=100, description="Quality level (1-100)")
+    max_fps: Optional[float] = Field(None, gt=0, description="Frame rate cap for animated images")
+    max_frames: Optional[int] = Field(None, ge=1, description="Frame count cap for animated images")
+    allow_format_change: bool = Field(
+        False, description="Allow animated images to be returned as WebP or MP4 when much smaller"
+    )
     
     class Config:
         json_schema_extra = {
@@ -35,6 +48,80 @@ class CompressionRequest(BaseModel):
         }
 
 
+class UploadSessionCreate(BaseModel):
+    """Resumable upload session creation model."""
+    filename: str
+    size: int = Field(..., gt=0, description="Total upload size in bytes")
+
+
+class UploadSessionResponse(BaseModel):
+    """Resumable upload session state model."""
+    upload_id: str
+    filename: str
+    file_type: FileType
+    size: int
+    offset: int
+    max_chunk_size: int
+    complete: bool
+    probe: Optional[dict] = None
+
+
+class ImageFormat(str, Enum):
+    """Output formats for image variants."""
+    JPEG = "jpeg"
+    WEBP = "webp"
+    PNG = "png"
+
+
+class ImageVariant(BaseModel):
+    """A single derivative to generate from an uploaded image."""
+    name: str = Field(..., pattern=r"^[A-Za-z0-9_-]+$")
+    max_width: Optional[int] = Field(None, gt=0, description="Maximum width in pixels")
+    max_height: Optional[int] = Field(None, gt=0, description="Maximum height in pixels")
+    format: ImageFormat = ImageFormat.JPEG
+    quality: int = Field(80, ge=1, le=100)
+
+
+DEFAULT_IMAGE_VARIANTS = [
+    ImageVariant(name=f"{size_name}_{image_format.value}", max_width=size, max_height=size, format=image_format)
+    for size_name, size in (("thumbnail", 320), ("medium", 1280), ("full", None))
+    for image_format in (ImageFormat.WEBP, ImageFormat.JPEG)
+]
+
+
+class VariantsRequest(BaseModel):
+    """Image variants request model."""
+    variants: list[ImageVariant] = Field(default_factory=lambda: list(DEFAULT_IMAGE_VARIANTS), min_length=1)
+    
+    @field_validator("variants")
+    @classmethod
+    def unique_names(cls, variants: list[ImageVariant]) -> list[ImageVariant]:
+        names = [variant.name for variant in variants]
+        if len(names) != len(set(names)):
+            raise ValueError("Variant names must be unique")
+        return variants
+
+
+class VariantOutput(BaseModel):
+    """A generated image variant."""
+    name: str
+    format: ImageFormat
+    width: int
+    height: int
+    size: int
+    filename: str
+    download_url: str
+
+
+class VariantsResponse(BaseModel):
+    """Image variants manifest model."""
+    success: bool
+    original_size: int
+    width: int
+    height: int
+    variants: list[VariantOutput]
+
+
 class FileInfo(BaseModel):
     """File information model."""
     filename: str
@@ -52,3 +139,38 @@ class CompressionResponse(BaseModel):
     filename: str
     download_url: str
     message: Optional[str] = None
+
+
+class EstimateRequest(BaseModel):
+    """Parameters for a dry-run size and time estimate."""
+    quality: int = Field(75, ge=1, le=100, description="Quality level to estimate")
+    reduction_percentage: int = Field(50, ge=1, le=99, description="Reduction percentage to estimate")
+    target_size_mb: Optional[float] = Field(None, gt=0, description="Target size to estimate, if any")
+
+
+class StrategyEstimate(BaseModel):
+    """Predicted outcome of one compression strategy."""
+    strategy: CompressionStrategy
+    estimated_size: Optional[int] = None
+    estimated_reduction: Optional[float] = None
+    estimated_seconds: float
+    feasible: bool = True
+    warnings: list[str] = Field(default_factory=list)
+
+
+class EstimateResponse(BaseModel):
+    """Dry-run estimate model."""
+    file_type: FileType
+    original_size: int
+    duration: Optional[float] = None
+    method: str
+    estimates: list[StrategyEstimate]
+
+
+class JobResponse(BaseModel):
+    """Queued compression job model."""
+    job_id: str
+    status: JobStatus
+    status_url: str
+    result: Optional[CompressionResponse] = None
+    error: Optional[str] = None
@@ -1,21 +1,165 @@
 """Compression API routes."""
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse
-from pathlib import Path
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks, Request, Query, Header
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 import json
-from typing import Optional
+import math
+from pathlib import Path
+from dataclasses import asdict
+from pydantic import ValidationError
+from typing import Optional, Tuple, Union
 
-from app.models import CompressionRequest, CompressionResponse, FileType
+from app.models import (
+    CompressionRequest, CompressionResponse, EstimateRequest, EstimateResponse, FileType, JobResponse, JobStatus,
+    UploadSessionCreate, UploadSessionResponse, VariantsRequest, VariantsResponse, VariantOutput
+)
 from app.utils.file_handler import FileHandler
-from app.services import ImageCompressor, VideoCompressor, AudioCompressor, DocumentCompressor
+from app.utils.scratch import InsufficientSpaceError, scratch
+from app.utils.storage import get_output_storage, get_upload_storage
+from app.services import registry, CompressionSource
+from app.services.scheduler import scheduler, SchedulerError
+from app.services.job_queue import Job, get_job_queue
+from app.services.pipeline import compress_to_storage
+from app.services.image_variants import ImageVariantGenerator
+from app.services.estimator import CompressionEstimator
+from app.services.ffmpeg_stream import FFmpegPipe, limit_size, prepend, read_container_head, spill_to_disk
+from app.services.upload_sessions import UploadSession, UploadError, upload_sessions
 from app.config import settings
 
 router = APIRouter(prefix="/compress", tags=["compression"])
 
 
+def _client_id(request: Request) -> str:
+    """Identify the client for rate limiting and fair queueing.
+    
+    X-Client-ID is only honoured from trusted proxies; anyone else could
+    pick a fresh value per request to get a fresh rate limit.
+    """
+    peer = request.client.host if request.client else "anonymous"
+    if peer in settings.TRUSTED_PROXIES:
+        return request.headers.get("X-Client-ID") or peer
+    return peer
+
+
+def _retry_later(e: Union[SchedulerError, InsufficientSpaceError]) -> HTTPException:
+    """HTTP error for a request turned away by admission control."""
+    return HTTPException(
+        status_code=e.status_code,
+        detail=str(e),
+        headers={"Retry-After": str(math.ceil(e.retry_after))}
+    )
+
+
+async def _inspect_upload(file: UploadFile) -> Tuple[FileType, int]:
+    """Validate the size and type of an upload without reading it into memory."""
+    size = file.size
+    if size is None:
+        size = file.file.seek(0, 2)
+    await file.seek(0)
+    
+    # Validate file size
+    if size > settings.MAX_FILE_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File too large. Maximum size is {settings.MAX_FILE_SIZE / (1024*1024)}MB"
+        )
+    
+    # Determine file type from the extension and the leading bytes
+    header = await file.read(2048)
+    await file.seek(0)
+    try:
+        file_type, _ = FileHandler.get_file_type(file.filename, header)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return file_type, size
+
+
+def _parse_compression_request(compression_data: str) -> CompressionRequest:
+    """Parse the compression_data form field, mapping bad input to 400/422."""
+    try:
+        return CompressionRequest(**json.loads(compression_data))
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid compression data format")
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+
+
+def _probe_duration(source: CompressionSource, size: int) -> Optional[float]:
+    """Media duration of a source, without copying an upload to disk."""
+    if source.kind == "path":
+        return FileHandler.get_media_duration(source.as_path())
+    stream = source.open()
+    if not stream.seekable():
+        return None
+    return FileHandler.get_stream_duration(stream, size)
+
+
+def _download_url(filename: str) -> str:
+    """Direct storage URL for a result, falling back to the download endpoint."""
+    return get_output_storage().download_url(filename, filename) or f"/api/compress/download/{filename}"
+
+
+async def _run_compression(
+    http_request: Request,
+    file_type: FileType,
+    source: CompressionSource,
+    original_size: int,
+    output_filename: str,
+    compression_request: CompressionRequest,
+    duration: Optional[float] = None
+) -> CompressionResponse:
+    """Schedule and run a compression, mapping failures to HTTP errors."""
+    client_id = _client_id(http_request)
+    try:
+        scheduler.check_rate_limit(client_id)
+        # Reject up front if scratch or result storage would run out mid-job
+        scratch.admit(original_size, get_output_storage().free_bytes())
+        
+        # Probe media duration so long encodes are classified as expensive
+        if duration is None and file_type in (FileType.VIDEO, FileType.AUDIO):
+            # The probe reads the whole upload; don't pay for it if the queue is full
+            scheduler.check_capacity(file_type, original_size)
+            # Uploads are spilled to scratch only once the job runs, so no space is held while it waits
+            duration = await run_in_threadpool(_probe_duration, source, original_size)
+        
+        # Perform compression once the scheduler admits the job
+        output_filename, compressed_size = await scheduler.submit(
+            client_id,
+            file_type,
+            original_size,
+            compress_to_storage,
+            file_type,
+            source,
+            output_filename,
+            compression_request,
+            duration=duration,
+        )
+        
+        # Calculate reduction percentage
+        reduction = ((original_size - compressed_size) / original_size) * 100
+        
+        return CompressionResponse(
+            success=True,
+            original_size=original_size,
+            compressed_size=compressed_size,
+            reduction_percentage=round(reduction, 2),
+            filename=output_filename,
+            download_url=_download_url(output_filename),
+            message="File compressed successfully"
+        )
+    
+    except (SchedulerError, InsufficientSpaceError) as e:
+        raise _retry_later(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Compression failed: {str(e)}")
+    finally:
+        source.cleanup()
+
+
 @router.post("/", response_model=CompressionResponse)
 async def compress_file(
-    background_tasks: BackgroundTasks,
+    http_request: Request,
     file: UploadFile = File(...),
     compression_data: str = Form(...)
 ):
@@ -29,87 +173,496 @@ async def compress_file(
     Returns:
         CompressionResponse with compression details
     """
+    compression_request = _parse_compression_request(compression_data)
     try:
-        # Parse compression request
-        request_data = json.loads(compression_data)
-        compression_request = CompressionRequest(**request_data)
-        
-        # Read file content
-        content = await file.read()
-        
-        # Validate file size
-        if len(content) > settings.MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=413,
-                detail=f"File too large. Maximum size is {settings.MAX_FILE_SIZE / (1024*1024)}MB"
-            )
-        
-        # Determine file type
-        try:
-            file_type, mime_type = FileHandler.get_file_type(file.filename, content)
-        except ValueError as e:
-            raise HTTPException(status_code=400, detail=str(e))
+        file_type, original_size = await _inspect_upload(file)
         
         # Generate unique filenames
         input_filename = FileHandler.generate_unique_filename(file.filename)
         output_filename = f"compressed_{input_filename}"
         
-        # Save uploaded file
-        input_path = FileHandler.save_uploaded_file(
-            content,
-            input_filename,
-            settings.UPLOAD_DIR
+        # Compress straight from the upload stream; only tools that need a
+        # real file (FFmpeg) spill it into the job's scratch workspace
+        source = CompressionSource(file.file, filename=input_filename)
+        return await _run_compression(
+            http_request, file_type, source, original_size, output_filename, compression_request
         )
-        output_path = settings.COMPRESSED_DIR / output_filename
-        
-        # Get original size
-        original_size = FileHandler.get_file_size(input_path)
-        
-        # Compress based on file type
-        try:
-            if file_type == FileType.IMAGE:
-                compressor = ImageCompressor(input_path, output_path)
-            elif file_type == FileType.VIDEO:
-                compressor = VideoCompressor(input_path, output_path)
-            elif file_type == FileType.AUDIO:
-                compressor = AudioCompressor(input_path, output_path)
-            elif file_type == FileType.DOCUMENT:
-                compressor = DocumentCompressor(input_path, output_path)
-            else:
-                raise HTTPException(status_code=400, detail="Unsupported file type")
-            
-            # Perform compression
-            compressed_path = compressor.compress(compression_request)
-            compressed_size = FileHandler.get_file_size(compressed_path)
-            
-            # Calculate reduction percentage
-            reduction = ((original_size - compressed_size) / original_size) * 100
-            
-            # Schedule cleanup of input file
-            background_tasks.add_task(FileHandler.cleanup_file, input_path)
-            
-            return CompressionResponse(
-                success=True,
-                original_size=original_size,
-                compressed_size=compressed_size,
-                reduction_percentage=round(reduction, 2),
-                filename=output_filename,
-                download_url=f"/api/compress/download/{output_filename}",
-                message="File compressed successfully"
-            )
-            
-        except Exception as e:
-            # Cleanup files on error
-            FileHandler.cleanup_file(input_path)
-            FileHandler.cleanup_file(output_path)
-            raise HTTPException(status_code=500, detail=f"Compression failed: {str(e)}")
     
-    except json.JSONDecodeError:
-        raise HTTPException(status_code=400, detail="Invalid compression data format")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/variants", response_model=VariantsResponse)
+async def generate_variants(
+    http_request: Request,
+    file: UploadFile = File(...),
+    variants_data: Optional[str] = Form(None)
+):
+    """
+    Generate several sizes and formats of an image from a single upload.
+    
+    The image is decoded once, each smaller size is resampled from the
+    next larger one and variants are encoded in parallel, up to
+    VARIANT_ENCODE_THREADS at a time. Each encode thread takes a scheduler
+    slot.
+    
+    Args:
+        file: The image to process
+        variants_data: Optional JSON with a "variants" list; defaults to
+            thumbnail, medium and full size in WebP and JPEG
+    
+    Returns:
+        VariantsResponse listing every generated output
+    """
+    try:
+        variants_request = VariantsRequest(**json.loads(variants_data)) if variants_data else VariantsRequest()
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid variants data format")
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+    
+    client_id = _client_id(http_request)
+    try:
+        scheduler.check_rate_limit(client_id)
+    except SchedulerError as e:
+        raise _retry_later(e)
+    
+    file_type, original_size = await _inspect_upload(file)
+    if file_type != FileType.IMAGE:
+        raise HTTPException(status_code=400, detail="Variants can only be generated for images")
+    
+    input_filename = FileHandler.generate_unique_filename(file.filename)
+    generator = ImageVariantGenerator(CompressionSource(file.file, filename=input_filename), input_filename)
+    variants = variants_request.variants
+    try:
+        cost = await run_in_threadpool(generator.estimate_cost, variants)
+        threads = min(settings.VARIANT_ENCODE_THREADS, len(variants), scheduler.max_slots(cost))
+        (width, height), outputs = await scheduler.submit(
+            client_id,
+            file_type,
+            original_size,
+            generator.generate,
+            variants,
+            threads,
+            cost=cost,
+            slots=threads,
+        )
+    except SchedulerError as e:
+        raise _retry_later(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Variant generation failed: {str(e)}")
+    
+    return VariantsResponse(
+        success=True,
+        original_size=original_size,
+        width=width,
+        height=height,
+        variants=[
+            VariantOutput(**output, download_url=_download_url(output["filename"]))
+            for output in outputs
+        ]
+    )
+
+
+@router.post("/estimate", response_model=EstimateResponse)
+async def estimate_compression(
+    http_request: Request,
+    file: UploadFile = File(...),
+    estimate_data: Optional[str] = Form(None)
+):
+    """
+    Predict output size, reduction and time for each strategy without compressing.
+    
+    Images are trial-encoded on downsampled proxies and audio/video by
+    encoding a few seconds of samples. Uploaded audio/video is still copied
+    to scratch once so FFmpeg can seek in it.
+    
+    Args:
+        file: The file to estimate
+        estimate_data: Optional JSON with quality, reduction_percentage and
+            target_size_mb to estimate; defaults to quality 75 and 50%
+    
+    Returns:
+        EstimateResponse with one estimate per strategy
+    """
+    try:
+        params = EstimateRequest(**json.loads(estimate_data)) if estimate_data else EstimateRequest()
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid estimate data format")
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+    
+    try:
+        scheduler.check_rate_limit(_client_id(http_request))
+    except SchedulerError as e:
+        raise _retry_later(e)
+    
+    file_type, original_size = await _inspect_upload(file)
+    input_filename = FileHandler.generate_unique_filename(file.filename)
+    estimator = CompressionEstimator(CompressionSource(file.file, filename=input_filename), file_type)
+    try:
+        if estimator.needs_spill:
+            scratch.admit(original_size)
+        result = await scheduler.submit(
+            _client_id(http_request),
+            file_type,
+            original_size,
+            estimator.estimate,
+            params,
+            cost=estimator.cost,
+        )
+    except (SchedulerError, InsufficientSpaceError) as e:
+        raise _retry_later(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Estimation failed: {str(e)}")
+    finally:
+        estimator.close()
+    
+    return EstimateResponse(file_type=file_type, original_size=original_size, **result)
+
+
+def _job_response(job: Job) -> JobResponse:
+    """Build the API view of a queued job."""
+    result = None
+    if job.status == JobStatus.COMPLETED and job.result:
+        original_size = job.result["original_size"]
+        compressed_size = job.result["compressed_size"]
+        result = CompressionResponse(
+            success=True,
+            original_size=original_size,
+            compressed_size=compressed_size,
+            reduction_percentage=round(((original_size - compressed_size) / original_size) * 100, 2),
+            filename=job.result["filename"],
+            download_url=_download_url(job.result["filename"]),
+            message="File compressed successfully"
+        )
+    return JobResponse(
+        job_id=job.job_id,
+        status=job.status,
+        status_url=f"/api/compress/jobs/{job.job_id}",
+        result=result,
+        error=job.error if job.status == JobStatus.FAILED else None
+    )
+
+
+@router.post("/jobs", response_model=JobResponse, status_code=202)
+async def enqueue_compression(
+    http_request: Request,
+    file: UploadFile = File(...),
+    compression_data: str = Form(...)
+):
+    """
+    Queue a file for compression by a worker node.
+    
+    Args:
+        file: The file to compress
+        compression_data: JSON string containing compression parameters
+    
+    Returns:
+        JobResponse with the job id and a URL to poll for the result
+    """
+    compression_request = _parse_compression_request(compression_data)
+    
+    queue = get_job_queue()
+    try:
+        scheduler.check_rate_limit(_client_id(http_request))
+    except SchedulerError as e:
+        raise _retry_later(e)
+    if await run_in_threadpool(queue.pending_count) >= settings.QUEUE_MAX_PENDING:
+        raise HTTPException(status_code=503, detail="Job queue is full", headers={"Retry-After": "30"})
+    
+    file_type, size = await _inspect_upload(file)
+    try:
+        scratch.check_free(get_upload_storage().free_bytes(), size)
+    except InsufficientSpaceError as e:
+        raise _retry_later(e)
+    
+    # Stream the upload into shared storage for the worker to pick up
+    input_filename = FileHandler.generate_unique_filename(file.filename)
+    await run_in_threadpool(get_upload_storage().save, input_filename, file.file)
+    job = Job(
+        file_type=file_type.value,
+        input_key=input_filename,
+        output_key=f"compressed_{input_filename}",
+        request=compression_request.model_dump(mode="json"),
+        max_attempts=settings.JOB_MAX_ATTEMPTS
+    )
+    await run_in_threadpool(queue.enqueue, job)
+    return _job_response(job)
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """Get the status and, once finished, the result of a queued job."""
+    job = await run_in_threadpool(get_job_queue().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_response(job)
+
+
+def _session_response(session: UploadSession) -> UploadSessionResponse:
+    """Build the API view of an upload session."""
+    return UploadSessionResponse(
+        upload_id=session.upload_id,
+        filename=session.original_filename,
+        file_type=session.file_type,
+        size=session.size,
+        offset=session.offset,
+        max_chunk_size=settings.UPLOAD_MAX_CHUNK_SIZE,
+        complete=session.complete,
+        probe=session.probe
+    )
+
+
+def _get_session(upload_id: str) -> UploadSession:
+    session = upload_sessions.get(upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return session
+
+
+@router.post("/uploads", response_model=UploadSessionResponse, status_code=201)
+async def create_upload(body: UploadSessionCreate):
+    """
+    Start a resumable upload.
+    
+    Args:
+        body: Original filename and total size in bytes
+    
+    Returns:
+        UploadSessionResponse with the upload id and current offset
+    """
+    if body.size > settings.MAX_FILE_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File too large. Maximum size is {settings.MAX_FILE_SIZE / (1024*1024)}MB"
+        )
+    try:
+        file_type, _ = FileHandler.get_file_type(body.filename, b"")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        scratch.check_directory(upload_sessions.directory, body.size)
+    except InsufficientSpaceError as e:
+        raise _retry_later(e)
+    
+    session = await run_in_threadpool(upload_sessions.create, body.filename, body.size, file_type)
+    return _session_response(session)
+
+
+@router.get("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def get_upload(upload_id: str):
+    """Get the state of an upload; clients resume from the returned offset."""
+    return _session_response(_get_session(upload_id))
+
+
+@router.put("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def upload_chunk(
+    upload_id: str,
+    http_request: Request,
+    background_tasks: BackgroundTasks,
+    offset: int = Query(..., ge=0),
+    x_chunk_sha256: str = Header(..., description="Hex SHA-256 of the chunk body")
+):
+    """
+    Upload one chunk of a resumable upload.
+    
+    Args:
+        upload_id: Upload session id
+        offset: Byte offset of the chunk; must equal the session's current offset
+        x_chunk_sha256: Checksum of the chunk, verified before it is stored
+    
+    Returns:
+        UploadSessionResponse with the new offset
+    """
+    _get_session(upload_id)
+    
+    data = bytearray()
+    async for piece in http_request.stream():
+        data.extend(piece)
+        if len(data) > settings.UPLOAD_MAX_CHUNK_SIZE:
+            raise HTTPException(status_code=413, detail="Chunk too large")
+    
+    try:
+        session = await run_in_threadpool(
+            upload_sessions.write_chunk, upload_id, offset, bytes(data), x_chunk_sha256
+        )
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    except UploadError as e:
+        # The session may have expired or been aborted in the meantime
+        current = upload_sessions.get(upload_id)
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"Upload-Offset": str(current.offset)} if current else None
+        )
+    
+    # Inspect the file as soon as its header has arrived, overlapping the
+    # probe with the rest of the upload
+    if await run_in_threadpool(upload_sessions.start_probe, upload_id):
+        background_tasks.add_task(upload_sessions.probe, upload_id)
+    
+    return _session_response(session)
+
+
+@router.post("/uploads/{upload_id}/complete", response_model=CompressionResponse)
+async def complete_upload(
+    upload_id: str,
+    http_request: Request,
+    compression_data: str = Form(...)
+):
+    """
+    Finish a resumable upload and compress it.
+    
+    Args:
+        upload_id: Upload session id
+        compression_data: JSON string containing compression parameters
+    
+    Returns:
+        CompressionResponse with compression details
+    """
+    compression_request = _parse_compression_request(compression_data)
+    
+    session = _get_session(upload_id)
+    if not session.complete:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Upload incomplete: {session.offset} of {session.size} bytes received",
+            headers={"Upload-Offset": str(session.offset)}
+        )
+    
+    # Only one request may compress and publish a session
+    if not await run_in_threadpool(upload_sessions.claim, upload_id):
+        raise HTTPException(status_code=409, detail="Upload is already being completed")
+    try:
+        # Another request may have completed and discarded it before the claim
+        session = _get_session(upload_id)
+        source = CompressionSource(upload_sessions.part_path(session), filename=session.filename)
+        response = await _run_compression(
+            http_request,
+            session.file_type,
+            source,
+            session.size,
+            f"compressed_{session.filename}",
+            compression_request,
+            duration=(session.probe or {}).get("duration")
+        )
+    except BaseException:
+        # On failure the session is kept so the client can retry without re-uploading
+        await run_in_threadpool(upload_sessions.release, upload_id)
+        raise
+    await run_in_threadpool(upload_sessions.discard, upload_id)
+    return response
+
+
+@router.delete("/uploads/{upload_id}", status_code=204)
+async def abort_upload(upload_id: str):
+    """Abort a resumable upload and discard the received data."""
+    _get_session(upload_id)
+    if upload_sessions.is_claimed(upload_id):
+        raise HTTPException(status_code=409, detail="Upload is being completed")
+    await run_in_threadpool(upload_sessions.discard, upload_id)
+
+
+class _DuplexStreamingResponse(StreamingResponse):
+    """Streaming response that lets the endpoint keep reading the request body.
+    
+    StreamingResponse listens for client disconnects by consuming ASGI
+    receive messages, which would swallow body chunks still being uploaded.
+    """
+    
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await self.stream_response(send)
+        finally:
+            # Also runs when the client went away before the body was iterated
+            if self.background is not None:
+                await self.background()
+
+
+@router.post("/stream")
+async def compress_stream(
+    http_request: Request,
+    filename: str = Query(..., description="Original filename, used to detect the format"),
+    quality: int = Query(75, ge=1, le=100),
+    output_format: Optional[str] = Query(None, description="mp4 for video; mp3 or ogg for audio")
+):
+    """
+    Compress audio or video while it uploads and stream the result back.
+    
+    The raw request body is piped into FFmpeg and the encoded output is
+    returned as it is produced, without writing the upload or the result
+    to disk. MP4/MOV inputs whose index follows the media data are spilled
+    to a reserved scratch workspace first because FFmpeg has to seek in
+    them; without a Content-Length the reservation is for MAX_FILE_SIZE.
+    
+    Args:
+        filename: Original filename
+        quality: Quality level (1-100)
+        output_format: Streamable output container
+    
+    Returns:
+        Streaming response with the compressed media
+    """
+    try:
+        file_type, _ = FileHandler.get_file_type(filename, b"")
+        media_type, output_args = registry.get(file_type).stream_output_args(quality, output_format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        content_length = int(http_request.headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Content-Length header")
+    if content_length > settings.MAX_FILE_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File too large. Maximum size is {settings.MAX_FILE_SIZE / (1024*1024)}MB"
+        )
+    try:
+        scheduler.check_rate_limit(_client_id(http_request))
+    except SchedulerError as e:
+        raise _retry_later(e)
+    if FFmpegPipe.active >= settings.MAX_CONCURRENT_STREAMS:
+        raise HTTPException(status_code=503, detail="Too many active streams", headers={"Retry-After": "5"})
+    # Take the slot before the first await so concurrent requests cannot all pass the check
+    input_size = content_length or settings.MAX_FILE_SIZE
+    try:
+        pipe = FFmpegPipe(output_args, input_size)
+    except InsufficientSpaceError as e:
+        raise _retry_later(e)
+    
+    try:
+        suffix = Path(filename).suffix.lower()
+        chunks = limit_size(http_request.stream(), input_size)
+        head, needs_seek = await read_container_head(chunks, suffix)
+        body = prepend(head, chunks)
+        if needs_seek:
+            pipe.input_path = await spill_to_disk(body, suffix, pipe.workspace)
+        await pipe.start(None if needs_seek else body)
+    except ValueError as e:
+        await pipe.close()
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        await pipe.close()
+        raise HTTPException(status_code=500, detail=f"Streaming failed: {str(e)}")
+    except BaseException:
+        await pipe.close()
+        raise
+    
+    extension = output_format or next(iter(registry.get(file_type).stream_formats))
+    output_filename = f"compressed_{Path(filename).stem}.{extension}"
+    return _DuplexStreamingResponse(
+        pipe.iter_output(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{output_filename}"'},
+        background=BackgroundTask(pipe.close)
+    )
+
+
 @router.get("/download/{filename}")
 async def download_file(filename: str, background_tasks: BackgroundTasks):
     """
@@ -119,23 +672,42 @@ async def download_file(filename: str, background_tasks: BackgroundTasks):
         filename: Name of the file to download
     
     Returns:
-        FileResponse with the compressed file
+        FileResponse with the compressed file, or a redirect to a presigned
+        URL when results live in object storage
     """
-    file_path = settings.COMPRESSED_DIR / filename
+    storage = get_output_storage()
     
-    if not file_path.exists():
+    if not await run_in_threadpool(storage.exists, filename):
         raise HTTPException(status_code=404, detail="File not found")
     
+    # Let the client fetch the bytes from storage directly when possible
+    url = storage.download_url(filename, filename)
+    if url is not None:
+        return RedirectResponse(url, status_code=307)
+    
     # Schedule file cleanup after download
-    background_tasks.add_task(FileHandler.cleanup_file, file_path)
+    background_tasks.add_task(storage.delete, filename)
     
-    return FileResponse(
-        path=file_path,
-        filename=filename,
-        media_type="application/octet-stream"
+    file_path = storage.local_path(filename)
+    if file_path is not None:
+        return FileResponse(
+            path=file_path,
+            filename=filename,
+            media_type="application/octet-stream"
+        )
+    return StreamingResponse(
+        storage.open(filename),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
     )
 
 
+@router.get("/queue")
+async def get_queue_state():
+    """Get current scheduler queue depths, concurrency per job class and scratch usage."""
+    return {**scheduler.state(), "scratch": scratch.state()}
+
+
 @router.get("/info")
 async def get_info():
     """Get information about supported formats and limits."""
@@ -147,5 +719,9 @@ async def get_info():
             "audio": list(settings.SUPPORTED_AUDIO_FORMATS),
             "documents": list(settings.SUPPORTED_DOCUMENT_FORMATS)
         },
-        "compression_strategies": ["quality", "target_size", "percentage"]
+        "compression_strategies": ["quality", "target_size", "percentage"],
+        "capabilities": {
+            file_type.value: asdict(registry.capabilities(file_type))
+            for file_type in registry.file_types()
+        }
     }
@@ -1,7 +1,13 @@
 """Compression services package."""
+from .base import BaseCompressor, CompressionSource, CompressorCapabilities, ExecutionPool
+from .registry import CompressorRegistry, registry
 from .image_compressor import ImageCompressor
 from .video_compressor import VideoCompressor
 from .audio_compressor import AudioCompressor
 from .document_compressor import DocumentCompressor
 
-__all__ = ['ImageCompressor', 'VideoCompressor', 'AudioCompressor', 'DocumentCompressor']
+__all__ = [
+    'BaseCompressor', 'CompressionSource', 'CompressorCapabilities', 'ExecutionPool',
+    'CompressorRegistry', 'registry',
+    'ImageCompressor', 'VideoCompressor', 'AudioCompressor', 'DocumentCompressor',
+]
@@ -0,0 +1,290 @@
+"""Frame-aware compression for animated GIF and WebP images."""
+import io
+import math
+import functools
+import shutil
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import ffmpeg
+from PIL import Image, ImageChops, ImageSequence
+from app.models import CompressionRequest, CompressionStrategy
+from app.config import settings
+from app.utils.scratch import owner_prefix
+from .video_compressor import VideoCompressor
+
+# Frames sampled (and the size they are shrunk to) when building the global palette
+PALETTE_SAMPLE_FRAMES = 32
+PALETTE_SAMPLE_SIZE = 256
+MIN_FRAME_DURATION = 20  # ms; browsers slow down shorter GIF delays
+MP4_MAX_FPS = 30
+
+# Target-size ladders, tried in order until the output fits:
+# (palette colors or quality, keep every n-th frame, scale)
+GIF_LADDER = [(256, 1, 1.0), (128, 1, 1.0), (64, 1, 1.0), (64, 2, 1.0),
+              (32, 2, 1.0), (32, 2, 0.75), (32, 3, 0.5)]
+WEBP_LADDER = [(90, 1, 1.0), (75, 1, 1.0), (60, 1, 1.0), (45, 1, 1.0),
+               (30, 1, 1.0), (30, 2, 1.0), (30, 2, 0.75), (20, 3, 0.5)]
+MP4_LADDER = [(75, 1, 1.0), (60, 1, 1.0), (45, 1, 1.0), (30, 1, 1.0), (30, 1, 0.5)]
+
+
+@dataclass
+class Frame:
+    """A fully composited animation frame and how long it is shown."""
+    image: Image.Image
+    duration: int
+
+
+def load_frames(img: Image.Image, max_pixels: Optional[int] = None) -> List[Frame]:
+    """Decode every frame as RGBA, merging consecutive duplicates.
+
+    Raises ValueError once the kept frames hold more than max_pixels pixels.
+    """
+    frames: List[Frame] = []
+    pixels = 0
+    for frame in ImageSequence.Iterator(img):
+        duration = int(frame.info.get('duration') or 100)
+        rgba = frame.convert('RGBA')
+        if frames and ImageChops.difference(frames[-1].image, rgba).getbbox(alpha_only=False) is None:
+            frames[-1].duration += duration
+            continue
+        pixels += rgba.width * rgba.height
+        if max_pixels is not None and pixels > max_pixels:
+            raise ValueError(f"Animation too large: more than {max_pixels} decoded pixels")
+        frames.append(Frame(rgba, duration))
+    return frames
+
+
+def decimate(frames: List[Frame], step: int) -> List[Frame]:
+    """Keep the last of every step frames, giving it the whole group's time.
+
+    The last frame is the one on screen when the group ends, which matters
+    for animations that build up a picture in partial updates.
+    """
+    if step <= 1:
+        return frames
+    kept = []
+    for index in range(0, len(frames), step):
+        group = frames[index:index + step]
+        kept.append(Frame(group[-1].image, sum(frame.duration for frame in group)))
+    return kept
+
+
+def reduce_frame_rate(frames: List[Frame], max_fps: Optional[float] = None,
+                      max_frames: Optional[int] = None) -> List[Frame]:
+    """Drop frames to honour a maximum frame rate and/or frame count.
+
+    Frames are left untouched unless a limit is given.
+    """
+    if not max_fps and not max_frames:
+        return frames
+    min_duration = MIN_FRAME_DURATION
+    if max_fps:
+        min_duration = max(min_duration, math.ceil(1000 / max_fps))
+    # Fold frames shown for less than min_duration together, keeping the last one
+    reduced: List[Frame] = []
+    for frame in frames:
+        if reduced and reduced[-1].duration < min_duration:
+            reduced[-1] = Frame(frame.image, reduced[-1].duration + frame.duration)
+        else:
+            reduced.append(Frame(frame.image, frame.duration))
+    if max_frames and len(reduced) > max_frames:
+        reduced = decimate(reduced, math.ceil(len(reduced) / max_frames))
+    return reduced
+
+
+def has_transparency(frames: List[Frame]) -> bool:
+    return any(frame.image.getchannel('A').getextrema()[0] < 255 for frame in frames)
+
+
+def build_global_palette(frames: List[Frame], colors: int) -> Image.Image:
+    """Quantize a montage of sampled frames into one palette for the whole animation."""
+    step = max(1, len(frames) // PALETTE_SAMPLE_FRAMES)
+    samples = []
+    for frame in frames[::step]:
+        sample = frame.image.convert('RGB')
+        sample.thumbnail((PALETTE_SAMPLE_SIZE, PALETTE_SAMPLE_SIZE))
+        samples.append(sample)
+    montage = Image.new('RGB', (max(s.width for s in samples), sum(s.height for s in samples)))
+    y = 0
+    for sample in samples:
+        montage.paste(sample, (0, y))
+        y += sample.height
+    return montage.quantize(colors, method=Image.Quantize.MEDIANCUT)
+
+
+def gif_colors(quality: int) -> int:
+    """Palette size for a quality level; GIF has no other quality knob."""
+    return max(16, min(256, round(quality * 2.56)))
+
+
+def _scaled(frames: List[Frame], scale: float) -> List[Frame]:
+    if scale >= 1.0:
+        return frames
+    width, height = frames[0].image.size
+    size = (max(1, int(width * scale)), max(1, int(height * scale)))
+    return [Frame(frame.image.resize(size, Image.Resampling.LANCZOS), frame.duration) for frame in frames]
+
+
+def encode_gif(frames: List[Frame], loop: Optional[int], colors: int) -> bytes:
+    """Encode frames as a GIF sharing one global palette.
+
+    Pillow's GIF writer crops each frame to the region that changed since
+    the previous one, so identical palette indices keep those deltas small.
+    A loop of None writes no loop extension, so the GIF plays once.
+    """
+    transparent = has_transparency(frames)
+    palette = build_global_palette(frames, min(colors, 255) if transparent else colors)
+    palette_data = palette.getpalette()
+    transparent_index = len(palette_data) // 3
+
+    paletted = []
+    for frame in frames:
+        # No dithering: per-frame dither noise would defeat the inter-frame deltas
+        image = frame.image.convert('RGB').quantize(palette=palette, dither=Image.Dither.NONE)
+        if transparent:
+            image.putpalette(palette_data + [0, 0, 0])
+            mask = frame.image.getchannel('A').point(lambda a: 255 if a < 128 else 0)
+            image.paste(transparent_index, (0, 0, image.width, image.height), mask)
+        paletted.append(image)
+
+    params = {}
+    if transparent:
+        # Transparent pixels must reveal the background, not the previous frame
+        params = {'transparency': transparent_index, 'disposal': 2}
+    if loop is not None:
+        params['loop'] = loop
+    buffer = io.BytesIO()
+    paletted[0].save(
+        buffer, format='GIF', save_all=True, append_images=paletted[1:],
+        duration=[frame.duration for frame in frames], optimize=False, **params,
+    )
+    return buffer.getvalue()
+
+
+def encode_webp(frames: List[Frame], loop: Optional[int], quality: int) -> bytes:
+    """Encode frames as an animated WebP; libwebp stores changed sub-rectangles only."""
+    buffer = io.BytesIO()
+    frames[0].image.save(
+        buffer, format='WEBP', save_all=True, append_images=[frame.image for frame in frames[1:]],
+        # WebP always stores a loop count; 1 plays once like a GIF without one
+        duration=[frame.duration for frame in frames], loop=1 if loop is None else loop,
+        quality=quality, method=4, minimize_size=True,
+    )
+    return buffer.getvalue()
+
+
+def encode_mp4(frames: List[Frame], loop: Optional[int], quality: int,
+               directory: Optional[Path] = None) -> bytes:
+    """Encode opaque frames as a short H.264 MP4 using the video compressor's settings.
+
+    The MP4 is written in directory, normally the job's scratch workspace,
+    because FFmpeg has to seek back to place the index at the front.
+    """
+    fps = min(MP4_MAX_FPS, max(1, round(1000 / min(frame.duration for frame in frames))))
+    width, height = frames[0].image.size
+    output_args = {k: v for k, v in VideoCompressor.quality_output_args(quality).items()
+                   if not k.startswith('a')}
+    with tempfile.TemporaryDirectory(dir=directory or settings.TEMP_DIR, prefix=owner_prefix()) as tmp:
+        output_path = Path(tmp) / "animation.mp4"
+        process = (
+            ffmpeg
+            .input('pipe:0', format='rawvideo', pix_fmt='rgb24', s=f'{width}x{height}', framerate=fps)
+            .output(str(output_path), vf='pad=ceil(iw/2)*2:ceil(ih/2)*2', pix_fmt='yuv420p',
+                    movflags='+faststart', an=None, **output_args)
+            .global_args('-loglevel', 'error')
+            .overwrite_output()
+            .run_async(pipe_stdin=True, pipe_stderr=True)
+        )
+        # Variable frame delays become repeated frames at a constant rate
+        for frame in frames:
+            data = frame.image.convert('RGB').tobytes()
+            for _ in range(max(1, round(frame.duration * fps / 1000))):
+                process.stdin.write(data)
+        _, stderr = process.communicate()
+        if process.returncode != 0:
+            raise RuntimeError(f"FFmpeg error: {stderr.decode(errors='replace')}")
+        return output_path.read_bytes()
+
+
+Encoder = Callable[[List[Frame], Optional[int], int], bytes]
+
+FORMATS: Dict[str, Tuple[str, Encoder, list]] = {
+    'GIF': ('.gif', encode_gif, GIF_LADDER),
+    'WEBP': ('.webp', encode_webp, WEBP_LADDER),
+    'MP4': ('.mp4', encode_mp4, MP4_LADDER),
+}
+
+
+class AnimatedImageCompressor:
+    """Compresses an animated GIF or WebP while keeping every distinct frame."""
+
+    def __init__(self, img: Image.Image, output_path: Path, original_size: int,
+                 workspace: Optional[Path] = None):
+        self.img = img
+        self.output_path = output_path
+        self.original_size = original_size
+        # Scratch directory for encoders that need intermediate files
+        self.workspace = workspace
+
+    def compress(self, request: CompressionRequest) -> Path:
+        """Compress the animation; may switch format if request.allow_format_change."""
+        # Absent in GIFs that play once; defaulting it would make them loop forever
+        loop = self.img.info.get('loop')
+        frames = load_frames(self.img, settings.ANIMATION_MAX_PIXELS)
+        frames = reduce_frame_rate(frames, request.max_fps, request.max_frames)
+
+        formats = [self.img.format]
+        if request.allow_format_change:
+            formats += [f for f in ('WEBP', 'MP4') if f != self.img.format]
+            if 'MP4' in formats and (has_transparency(frames) or shutil.which('ffmpeg') is None):
+                formats.remove('MP4')
+
+        if request.strategy == CompressionStrategy.QUALITY:
+            results = {fmt: self._encode_quality(fmt, frames, loop, request.quality) for fmt in formats}
+            target_size = None
+        elif request.strategy in (CompressionStrategy.TARGET_SIZE, CompressionStrategy.PERCENTAGE):
+            if request.strategy == CompressionStrategy.TARGET_SIZE:
+                target_size = int(request.target_size_mb * 1024 * 1024)
+            else:
+                target_size = int(self.original_size * (100 - request.reduction_percentage) / 100)
+            results = {fmt: self._encode_to_target(fmt, frames, loop, target_size) for fmt in formats}
+        else:
+            raise ValueError(f"Unknown compression strategy: {request.strategy}")
+
+        chosen = formats[0]
+        for fmt in formats[1:]:
+            size, primary_size = len(results[fmt]), len(results[chosen])
+            # Only change format when it pays off clearly, or it is the only way to fit the target
+            if size <= primary_size * settings.ANIMATION_FORMAT_SWITCH_RATIO or (
+                target_size is not None and primary_size > target_size >= size
+            ):
+                chosen = fmt
+
+        output_path = self.output_path
+        if chosen != formats[0]:
+            output_path = self.output_path.with_suffix(FORMATS[chosen][0])
+        output_path.write_bytes(results[chosen])
+        return output_path
+
+    def _encoder(self, fmt: str) -> Encoder:
+        encoder = FORMATS[fmt][1]
+        if encoder is encode_mp4:
+            return functools.partial(encode_mp4, directory=self.workspace)
+        return encoder
+
+    def _encode_quality(self, fmt: str, frames: List[Frame], loop: Optional[int], quality: int) -> bytes:
+        if fmt == 'GIF':
+            return encode_gif(frames, loop, gif_colors(quality))
+        return self._encoder(fmt)(frames, loop, quality)
+
+    def _encode_to_target(self, fmt: str, frames: List[Frame], loop: Optional[int], target_size: int) -> bytes:
+        """Walk the format's ladder until the output fits; falls back to the last, smallest setting."""
+        encoder, ladder = self._encoder(fmt), FORMATS[fmt][2]
+        data = b""
+        for level, step, scale in ladder:
+            data = encoder(_scaled(decimate(frames, step), scale), loop, level)
+            if len(data) <= target_size:
+                break
+        return data
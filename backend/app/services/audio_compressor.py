@@ -1,16 +1,27 @@
 """Audio compression service."""
 from pathlib import Path
 import ffmpeg
-from app.models import CompressionStrategy, CompressionRequest
+from app.models import CompressionStrategy, CompressionRequest, FileType
+from .base import BaseCompressor, CompressorCapabilities, ExecutionPool
+from .registry import registry
 
 
-class AudioCompressor:
+@registry.register(FileType.AUDIO)
+class AudioCompressor(BaseCompressor):
     """Handles audio compression using FFmpeg."""
     
-    def __init__(self, input_path: Path, output_path: Path):
-        self.input_path = input_path
-        self.output_path = output_path
-        self.original_size = input_path.stat().st_size
+    capabilities = CompressorCapabilities(
+        supports_target_size=True,
+        supports_streaming=True,
+        pool=ExecutionPool.SUBPROCESS,
+        base_cost=0.2,
+        cost_per_mb=0.02,
+        cost_per_media_second=0.02,
+    )
+    stream_formats = {
+        'mp3': ('audio/mpeg', {'format': 'mp3'}),
+        'ogg': ('audio/ogg', {'format': 'ogg', 'acodec': 'libvorbis'}),
+    }
     
     def compress(self, request: CompressionRequest) -> Path:
         """Compress audio based on strategy."""
@@ -23,21 +34,28 @@ class AudioCompressor:
         
         raise ValueError(f"Unknown compression strategy: {request.strategy}")
     
-    def _compress_by_quality(self, quality: int) -> Path:
-        """Compress audio with specified quality."""
+    MIN_BITRATE = 32000
+    MAX_BITRATE = 320000
+    
+    @classmethod
+    def target_bitrate(cls, target_size_bytes: int, duration: float) -> int:
+        """Bitrate needed to hit a target size, before the allowed range is applied."""
+        return int((target_size_bytes * 8) / duration)
+    
+    @classmethod
+    def quality_output_args(cls, quality: int) -> dict:
+        """FFmpeg output options for quality-based compression."""
         # Map quality (1-100) to bitrate (32k-320k)
         bitrate = int(32 + (quality / 100) * 288)
-        bitrate = f"{bitrate}k"
-        
+        return {'acodec': 'libmp3lame', 'audio_bitrate': f"{bitrate}k"}
+    
+    def _compress_by_quality(self, quality: int) -> Path:
+        """Compress audio with specified quality."""
         try:
             (
                 ffmpeg
                 .input(str(self.input_path))
-                .output(
-                    str(self.output_path),
-                    acodec='libmp3lame',
-                    audio_bitrate=bitrate
-                )
+                .output(str(self.output_path), **self.quality_output_args(quality))
                 .overwrite_output()
                 .run(capture_stdout=True, capture_stderr=True)
             )
@@ -54,14 +72,8 @@ class AudioCompressor:
         probe = ffmpeg.probe(str(self.input_path))
         duration = float(probe['format']['duration'])
         
-        # Calculate target bitrate
-        target_bitrate = int((target_size_bytes * 8) / duration)
-        
-        # Ensure bitrate is within reasonable range
-        if target_bitrate < 32000:  # Minimum 32kbps
-            target_bitrate = 32000
-        elif target_bitrate > 320000:  # Maximum 320kbps
-            target_bitrate = 320000
+        # Calculate target bitrate within the supported range
+        target_bitrate = min(max(self.target_bitrate(target_size_bytes, duration), self.MIN_BITRATE), self.MAX_BITRATE)
         
         bitrate = f"{target_bitrate // 1000}k"
         
@@ -0,0 +1,194 @@
+"""Common compressor interface shared by all compression services."""
+import io
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Optional, Tuple, Union
+from app.models import CompressionRequest
+from app.config import settings
+from app.utils.scratch import owner_prefix
+
+
+class ExecutionPool(str, Enum):
+    """Kind of work a compressor performs, used to route jobs to a pool."""
+    CPU = "cpu"
+    SUBPROCESS = "subprocess"
+
+
+@dataclass(frozen=True)
+class CompressorCapabilities:
+    """Static description of what a compressor can do and what it costs."""
+    supports_target_size: bool = True
+    supports_streaming: bool = False
+    pool: ExecutionPool = ExecutionPool.CPU
+    # Rough wall-clock cost model in seconds: base + per MB + per media second
+    base_cost: float = 0.05
+    cost_per_mb: float = 0.05
+    cost_per_media_second: float = 0.0
+
+
+SourceData = Union[Path, str, bytes, bytearray, BinaryIO]
+
+
+class CompressionSource:
+    """Input for a compressor: a file path, an in-memory buffer or a stream."""
+
+    def __init__(self, data: SourceData, filename: Optional[str] = None):
+        if isinstance(data, str):
+            data = Path(data)
+        if isinstance(data, bytearray):
+            data = bytes(data)
+        self._data = data
+        self._spilled_path: Optional[Path] = None
+        # Directory as_path() spills into; a job's workspace when set
+        self.spill_dir: Optional[Path] = None
+        if filename is None and isinstance(data, Path):
+            filename = data.name
+        self.filename = filename or ""
+
+    @classmethod
+    def coerce(cls, value: Union["CompressionSource", SourceData],
+               filename: Optional[str] = None) -> "CompressionSource":
+        """Wrap a raw path, buffer or stream unless it already is a source."""
+        if isinstance(value, CompressionSource):
+            return value
+        return cls(value, filename)
+
+    @property
+    def kind(self) -> str:
+        """Return 'path', 'buffer' or 'stream'."""
+        if isinstance(self._data, Path):
+            return "path"
+        if isinstance(self._data, bytes):
+            return "buffer"
+        return "stream"
+
+    @property
+    def suffix(self) -> str:
+        """Lower-cased file extension including the dot."""
+        return Path(self.filename).suffix.lower()
+
+    @property
+    def size(self) -> Optional[int]:
+        """Size in bytes, or None for a stream that cannot be measured."""
+        if self._spilled_path is not None:
+            return self._spilled_path.stat().st_size
+        if isinstance(self._data, Path):
+            return self._data.stat().st_size
+        if isinstance(self._data, bytes):
+            return len(self._data)
+        if self._data.seekable():
+            position = self._data.tell()
+            size = self._data.seek(0, io.SEEK_END)
+            self._data.seek(position)
+            return size - position
+        return None
+
+    def open(self) -> BinaryIO:
+        """Open the source for reading."""
+        # A spilled stream has been consumed; read its copy instead
+        if self._spilled_path is not None:
+            return open(self._spilled_path, 'rb')
+        if isinstance(self._data, Path):
+            return open(self._data, 'rb')
+        if isinstance(self._data, bytes):
+            return io.BytesIO(self._data)
+        return self._data
+
+    def read_bytes(self) -> bytes:
+        """Read the whole source into memory."""
+        if self._spilled_path is not None:
+            return self._spilled_path.read_bytes()
+        if isinstance(self._data, Path):
+            return self._data.read_bytes()
+        if isinstance(self._data, bytes):
+            return self._data
+        # Keep the buffered content so the source can be read again
+        self._data = self._data.read()
+        return self._data
+
+    def as_path(self) -> Path:
+        """Return a filesystem path, spilling buffers and streams to spill_dir or TEMP_DIR."""
+        if isinstance(self._data, Path):
+            return self._data
+        if self._spilled_path is None:
+            with tempfile.NamedTemporaryFile(
+                dir=self.spill_dir or settings.TEMP_DIR, prefix=owner_prefix(), suffix=self.suffix, delete=False
+            ) as f:
+                if isinstance(self._data, bytes):
+                    f.write(self._data)
+                else:
+                    shutil.copyfileobj(self._data, f)
+            self._spilled_path = Path(f.name)
+        return self._spilled_path
+
+    def cleanup(self) -> None:
+        """Remove any temporary file created by as_path()."""
+        if self._spilled_path is not None and self._spilled_path.exists():
+            self._spilled_path.unlink()
+        self._spilled_path = None
+
+
+class BaseCompressor(ABC):
+    """Base class for compressors registered in the compressor registry."""
+
+    capabilities: CompressorCapabilities = CompressorCapabilities()
+    # Output format name -> (media type, FFmpeg output options) for streaming
+    stream_formats: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+
+    def __init__(self, source: Union[CompressionSource, SourceData], output_path: Path):
+        self.source = CompressionSource.coerce(source)
+        self.output_path = output_path
+        self.original_size = self.source.size
+        if self.original_size is None:
+            self.original_size = len(self.source.read_bytes())
+
+    @property
+    def input_path(self) -> Path:
+        """Path of the input on disk, spilling in-memory sources if needed."""
+        return self.source.as_path()
+
+    @abstractmethod
+    def compress(self, request: CompressionRequest) -> Path:
+        """Compress the source according to the request and return the output path."""
+
+    @classmethod
+    def estimate_cost(cls, size_bytes: int, duration: Optional[float] = None) -> float:
+        """Estimate wall-clock seconds needed to compress an input of this size."""
+        caps = cls.capabilities
+        cost = caps.base_cost + (size_bytes / (1024 * 1024)) * caps.cost_per_mb
+        if duration:
+            cost += duration * caps.cost_per_media_second
+        return cost
+
+    @classmethod
+    def quality_output_args(cls, quality: int) -> Dict[str, Any]:
+        """FFmpeg output options for quality-based compression."""
+        raise NotImplementedError(f"{cls.__name__} does not use FFmpeg")
+
+    @classmethod
+    def stream_output_args(cls, quality: int, output_format: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
+        """Media type and FFmpeg output options for streaming compression."""
+        if not cls.capabilities.supports_streaming:
+            raise ValueError(f"{cls.__name__} does not support streaming")
+        output_format = output_format or next(iter(cls.stream_formats))
+        if output_format not in cls.stream_formats:
+            raise ValueError(
+                f"Unsupported stream format: {output_format} "
+                f"(expected one of {', '.join(cls.stream_formats)})"
+            )
+        media_type, format_args = cls.stream_formats[output_format]
+        return media_type, {**cls.quality_output_args(quality), **format_args}
+
+    def close(self) -> None:
+        """Release temporary resources held by the source."""
+        self.source.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
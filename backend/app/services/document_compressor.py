@@ -1,27 +1,33 @@
 """Document compression service."""
 from pathlib import Path
 from PyPDF2 import PdfReader, PdfWriter
-from app.models import CompressionStrategy, CompressionRequest
+from app.models import CompressionStrategy, CompressionRequest, FileType
+from .base import BaseCompressor, CompressorCapabilities, ExecutionPool
+from .registry import registry
 
 
-class DocumentCompressor:
+@registry.register(FileType.DOCUMENT)
+class DocumentCompressor(BaseCompressor):
     """Handles document compression."""
     
-    def __init__(self, input_path: Path, output_path: Path):
-        self.input_path = input_path
-        self.output_path = output_path
-        self.original_size = input_path.stat().st_size
+    capabilities = CompressorCapabilities(
+        supports_target_size=False,
+        supports_streaming=False,
+        pool=ExecutionPool.CPU,
+        base_cost=0.1,
+        cost_per_mb=0.2,
+    )
     
     def compress(self, request: CompressionRequest) -> Path:
         """Compress document based on file type."""
-        if self.input_path.suffix.lower() == '.pdf':
+        if self.source.suffix == '.pdf':
             return self._compress_pdf()
         else:
-            raise ValueError(f"Unsupported document format: {self.input_path.suffix}")
+            raise ValueError(f"Unsupported document format: {self.source.suffix}")
     
     def _compress_pdf(self) -> Path:
         """Compress PDF by removing redundant data."""
-        reader = PdfReader(str(self.input_path))
+        reader = PdfReader(self.source.open())
         writer = PdfWriter()
         
         # Copy all pages
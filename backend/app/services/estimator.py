@@ -0,0 +1,332 @@
+"""Dry-run size and time estimation for compression requests."""
+import io
+import itertools
+import math
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+import ffmpeg
+from PIL import Image, ImageSequence
+from app.models import CompressionStrategy, EstimateRequest, FileType
+from app.config import settings
+from app.utils.file_handler import FileHandler
+from app.utils.scratch import scratch
+from .animation import FORMATS as ANIMATION_FORMATS, Frame, gif_colors
+from .audio_compressor import AudioCompressor
+from .base import CompressionSource, SourceData
+from .image_compressor import ANIMATED_FORMATS, LOSSY_FORMATS, flatten_to_rgb
+from .registry import registry
+from .video_compressor import VideoCompressor
+
+# Longest side of the downsampled proxies images are trial-encoded at
+PROXY_SIDES = (256, 512)
+PROXY_FRAMES = 8
+# Below this reduction a strategy is reported as barely worthwhile
+MIN_USEFUL_REDUCTION = 5.0
+# Copying an upload to scratch so FFmpeg can seek in it, assuming ~100 MB/s
+SPILL_SECONDS_PER_MB = 0.01
+
+
+def _format_size(size: float) -> str:
+    """Format a byte count with a unit that suits its magnitude."""
+    if size < 1024:
+        return f"{size:.0f}B"
+    for unit in ("KB", "MB", "GB"):
+        size /= 1024
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f}{unit}"
+
+
+class _ProxyModel:
+    """Predicts full-size encoded bytes and encode time from downsampled proxies.
+
+    Encoded size grows sub-linearly with pixel count, since smaller images
+    carry more detail per pixel, so the exponent is fitted from two proxies.
+    """
+
+    def __init__(self, proxies: List[Tuple[int, Any]], encode: Callable[[Any, Any], int]):
+        self.proxies = proxies
+        self.encode = encode
+        self._measured: Dict[Any, List[Tuple[int, int, float]]] = {}
+
+    def _measure(self, setting: Any) -> List[Tuple[int, int, float]]:
+        if setting not in self._measured:
+            points = []
+            for pixels, proxy in self.proxies:
+                started = time.perf_counter()
+                size = self.encode(proxy, setting)
+                points.append((pixels, size, time.perf_counter() - started))
+            self._measured[setting] = points
+        return self._measured[setting]
+
+    def predict(self, setting: Any, pixels: int) -> Tuple[float, float]:
+        """Encoded bytes and encode seconds at the given pixel count."""
+        points = self._measure(setting)
+        proxy_pixels, proxy_size, proxy_seconds = points[-1]
+        exponent = 1.0
+        if len(points) > 1 and points[0][1] > 0 and proxy_size > 0:
+            small_pixels, small_size, _ = points[0]
+            exponent = math.log(proxy_size / small_size) / math.log(proxy_pixels / small_pixels)
+            exponent = min(1.2, max(0.5, exponent))
+        scale = pixels / proxy_pixels
+        return proxy_size * scale ** exponent, proxy_seconds * scale
+
+
+def _proxy_sizes(size: Tuple[int, int]) -> List[Tuple[int, int]]:
+    """Proxy dimensions, or just the full size for images that are already small."""
+    sizes = []
+    for side in PROXY_SIDES:
+        scale = side / max(size)
+        if scale < 1:
+            sizes.append((max(1, round(size[0] * scale)), max(1, round(size[1] * scale))))
+    return sizes or [size]
+
+
+class CompressionEstimator:
+    """Predicts output size, reduction and wall time without compressing the whole file.
+
+    Images are trial-encoded on downsampled proxies, audio and video by
+    encoding a few short samples. Documents fall back to the cost model.
+    """
+
+    def __init__(self, source: Union[CompressionSource, SourceData], file_type: FileType):
+        self.source = CompressionSource.coerce(source)
+        self.file_type = file_type
+        self.compressor_cls = registry.get(file_type)
+        self.original_size = self.source.size
+        if self.original_size is None:
+            self.original_size = len(self.source.read_bytes())
+        # FFmpeg needs a file to seek in; uploaded streams are copied to scratch once
+        self.needs_spill = file_type in (FileType.VIDEO, FileType.AUDIO) and self.source.kind != "path"
+
+    @property
+    def cost(self) -> float:
+        """Scheduler cost of the estimate itself.
+
+        Media only encode short samples but may have to be copied to scratch
+        first; images are decoded in full.
+        """
+        if self.file_type in (FileType.VIDEO, FileType.AUDIO):
+            sample_seconds = settings.ESTIMATE_SAMPLE_SECONDS * settings.ESTIMATE_SAMPLE_WINDOWS
+            cost = self.compressor_cls.estimate_cost(0, sample_seconds)
+            if self.needs_spill:
+                cost += self.original_size / (1024 * 1024) * SPILL_SECONDS_PER_MB
+            return cost
+        if self.file_type == FileType.IMAGE:
+            return self.compressor_cls.estimate_cost(self.original_size)
+        return self.compressor_cls.estimate_cost(0)
+
+    def estimate(self, params: EstimateRequest) -> Dict[str, Any]:
+        """Estimate every strategy; blocking, run it in a worker pool."""
+        targets = {CompressionStrategy.PERCENTAGE: int(self.original_size * (100 - params.reduction_percentage) / 100)}
+        if params.target_size_mb is not None:
+            targets[CompressionStrategy.TARGET_SIZE] = int(params.target_size_mb * 1024 * 1024)
+
+        if self.file_type == FileType.IMAGE:
+            return self._estimate_image(params.quality, targets)
+        if self.file_type in (FileType.VIDEO, FileType.AUDIO):
+            # The spilled copy counts against scratch space like a compression job
+            with scratch.workspace(self.original_size if self.needs_spill else 0) as workspace:
+                self.source.spill_dir = workspace
+                try:
+                    return self._estimate_media(params.quality, targets)
+                finally:
+                    self.source.cleanup()
+        return self._estimate_from_model(targets)
+
+    def close(self) -> None:
+        self.source.cleanup()
+
+    def _result(self, strategy: CompressionStrategy, size: Optional[float], seconds: float,
+                target: Optional[int] = None, warnings: Optional[List[str]] = None) -> Dict[str, Any]:
+        warnings = list(warnings or [])
+        feasible = True
+        reduction = None
+        if size is not None:
+            size = int(size)
+            reduction = round((1 - size / self.original_size) * 100, 2)
+            if target is not None and size > target:
+                feasible = False
+                # Callers that know why the target is missed explain it themselves
+                if not warnings:
+                    warnings.append(
+                        f"Target of {_format_size(target)} is not reachable; expect about {_format_size(size)}"
+                    )
+            elif reduction < 0:
+                warnings.append("Output is expected to be larger than the original")
+            elif reduction < MIN_USEFUL_REDUCTION:
+                warnings.append("Little size reduction expected")
+        return {
+            "strategy": strategy,
+            "estimated_size": size,
+            "estimated_reduction": reduction,
+            "estimated_seconds": round(seconds, 3),
+            "feasible": feasible,
+            "warnings": warnings,
+        }
+
+    def _estimate_image(self, quality: int, targets: Dict[CompressionStrategy, int]) -> Dict[str, Any]:
+        img = Image.open(self.source.open())
+        if getattr(img, 'is_animated', False) and img.format in ANIMATED_FORMATS:
+            return self._estimate_animation(img, quality, targets)
+
+        full_size = img.size
+        image_format = img.format or 'JPEG'
+        started = time.perf_counter()
+        # JPEG can decode straight at a reduced scale
+        img.draft(img.mode, (PROXY_SIDES[-1], PROXY_SIDES[-1]))
+        if img.mode in ('RGBA', 'LA', 'P') and image_format == 'JPEG':
+            img = flatten_to_rgb(img)
+        proxies = [(w * h, img.resize((w, h), Image.Resampling.LANCZOS)) for w, h in _proxy_sizes(full_size)]
+        decode_seconds = time.perf_counter() - started
+
+        def encode(proxy: Image.Image, setting: Tuple[str, int]) -> int:
+            # Mirrors the save parameters ImageCompressor uses for each path
+            strategy, level = setting
+            params = {'optimize': True, 'quality': level}
+            if image_format == 'PNG':
+                params = {'optimize': True, 'compress_level': 9 - (level // 11) if strategy == 'quality' else 9}
+            buffer = io.BytesIO()
+            proxy.save(buffer, format=image_format, **params)
+            return buffer.tell()
+
+        model = _ProxyModel(proxies, encode)
+        base_seconds = self.compressor_cls.capabilities.base_cost + decode_seconds
+        size, seconds = model.predict(('quality', quality), full_size[0] * full_size[1])
+        estimates = [self._result(CompressionStrategy.QUALITY, size, base_seconds + seconds)]
+
+        for strategy, target in targets.items():
+            estimates.append(self._simulate_image_target(strategy, model, image_format, full_size, target, base_seconds))
+        return {"method": "proxy", "duration": None, "estimates": estimates}
+
+    def _simulate_image_target(self, strategy: CompressionStrategy, model: _ProxyModel, image_format: str,
+                               full_size: Tuple[int, int], target: int, seconds: float) -> Dict[str, Any]:
+        """Follow ImageCompressor's quality ladder and resize loop on predicted sizes."""
+        width, height = full_size
+        qualities = range(95, 9, -5) if image_format in LOSSY_FORMATS else [95]
+        for quality in qualities:
+            size, encode_seconds = model.predict(('target', quality), width * height)
+            seconds += encode_seconds
+            if size <= target:
+                return self._result(strategy, size, seconds, target)
+
+        while True:
+            width, height = int(width * 0.9), int(height * 0.9)
+            size, encode_seconds = model.predict(('target', 85), width * height)
+            seconds += encode_seconds
+            if size <= target:
+                return self._result(strategy, size, seconds, target,
+                                    [f"Image will be downscaled to {width}x{height}"])
+            if width < 100:
+                return self._result(strategy, size, seconds, target, [
+                    f"Image would be shrunk to {width}x{height} and still be about {_format_size(size)}, "
+                    f"over the {_format_size(target)} target"
+                ])
+
+    def _estimate_animation(self, img: Image.Image, quality: int,
+                            targets: Dict[CompressionStrategy, int]) -> Dict[str, Any]:
+        """Trial-encode the first frames at proxy size and scale by frame count."""
+        n_frames = img.n_frames
+        full_size = img.size
+        started = time.perf_counter()
+        sample = [
+            Frame(frame.convert('RGBA'), int(frame.info.get('duration') or 100))
+            for frame in itertools.islice(ImageSequence.Iterator(img), PROXY_FRAMES)
+        ]
+        proxies = [
+            (w * h, [Frame(frame.image.resize((w, h), Image.Resampling.LANCZOS), frame.duration) for frame in sample])
+            for w, h in _proxy_sizes(full_size)
+        ]
+        base_seconds = self.compressor_cls.capabilities.base_cost + (time.perf_counter() - started) * n_frames / len(sample)
+        encoder = ANIMATION_FORMATS[img.format][1]
+        model = _ProxyModel(proxies, lambda frames, level: len(encoder(frames, 0, level)))
+
+        def predict(level: int, step: int = 1, scale: float = 1.0) -> Tuple[float, float]:
+            frames_factor = math.ceil(n_frames / step) / len(sample)
+            size, seconds = model.predict(level, int(full_size[0] * full_size[1] * scale * scale))
+            return size * frames_factor, seconds * frames_factor
+
+        size, seconds = predict(gif_colors(quality) if img.format == 'GIF' else quality)
+        estimates = [self._result(CompressionStrategy.QUALITY, size, base_seconds + seconds)]
+        for strategy, target in targets.items():
+            total_seconds = base_seconds
+            for level, step, scale in ANIMATION_FORMATS[img.format][2]:
+                size, seconds = predict(level, step, scale)
+                total_seconds += seconds
+                if size <= target:
+                    break
+            estimates.append(self._result(strategy, size, total_seconds, target))
+        return {"method": "proxy", "duration": None, "estimates": estimates}
+
+    def _sample_windows(self, duration: float) -> List[Tuple[float, float]]:
+        """Evenly spread (start, length) windows to sample-encode."""
+        length = settings.ESTIMATE_SAMPLE_SECONDS
+        count = settings.ESTIMATE_SAMPLE_WINDOWS
+        if duration <= length * count:
+            return [(0.0, duration)]
+        return [(max(0.0, duration * (i + 0.5) / count - length / 2), length) for i in range(count)]
+
+    def _sample_encode(self, output_args: Dict[str, Any], duration: float) -> Tuple[float, float]:
+        """Encode sample windows; returns output bytes and wall seconds per media second."""
+        path = str(self.source.as_path())
+        # The streaming output format needs no seekable output
+        format_args = next(iter(self.compressor_cls.stream_formats.values()))[1]
+        total_bytes = 0
+        sampled = 0.0
+        started = time.perf_counter()
+        for start, length in self._sample_windows(duration):
+            try:
+                out, _ = (
+                    ffmpeg
+                    .input(path, ss=start, t=length)
+                    .output('pipe:1', **{**output_args, **format_args})
+                    .run(capture_stdout=True, capture_stderr=True)
+                )
+            except ffmpeg.Error as e:
+                raise RuntimeError(f"FFmpeg error: {e.stderr.decode()}")
+            total_bytes += len(out)
+            sampled += length
+        return total_bytes / sampled, (time.perf_counter() - started) / sampled
+
+    def _estimate_media(self, quality: int, targets: Dict[CompressionStrategy, int]) -> Dict[str, Any]:
+        duration = FileHandler.get_media_duration(self.source.as_path())
+        if not duration:
+            return self._estimate_from_model(targets)
+
+        bytes_per_second, seconds_per_second = self._sample_encode(
+            self.compressor_cls.quality_output_args(quality), duration
+        )
+        encode_seconds = self.compressor_cls.capabilities.base_cost + seconds_per_second * duration
+        estimates = [self._result(CompressionStrategy.QUALITY, bytes_per_second * duration, encode_seconds)]
+
+        # Target sizes are bitrate-driven, so size follows from the bitrate the compressor will pick
+        for strategy, target in targets.items():
+            warnings = []
+            if self.file_type == FileType.VIDEO:
+                requested = VideoCompressor.target_video_bitrate(target, duration)
+                bitrate = max(requested, VideoCompressor.MIN_VIDEO_BITRATE) + VideoCompressor.AUDIO_BITRATE
+                if requested < VideoCompressor.MIN_VIDEO_BITRATE:
+                    warnings.append(
+                        f"Target needs {max(requested, 0) // 1000} kbps video but the minimum is "
+                        f"{VideoCompressor.MIN_VIDEO_BITRATE // 1000} kbps; "
+                        f"expect about {_format_size(bitrate * duration / 8)}"
+                    )
+            else:
+                requested = AudioCompressor.target_bitrate(target, duration)
+                bitrate = min(max(requested, AudioCompressor.MIN_BITRATE), AudioCompressor.MAX_BITRATE)
+                if requested > AudioCompressor.MAX_BITRATE:
+                    warnings.append(f"Bitrate is capped at {AudioCompressor.MAX_BITRATE // 1000} kbps; output will be smaller")
+            size = bitrate * duration / 8
+            estimates.append(self._result(strategy, size, encode_seconds, target, warnings))
+        return {"method": "sample", "duration": duration, "estimates": estimates}
+
+    def _estimate_from_model(self, targets: Dict[CompressionStrategy, int]) -> Dict[str, Any]:
+        """Time from the cost model only; the output size cannot be predicted cheaply."""
+        seconds = self.compressor_cls.estimate_cost(self.original_size)
+        estimates = [self._result(CompressionStrategy.QUALITY, None, seconds)]
+        for strategy in targets:
+            result = self._result(strategy, None, seconds)
+            if not self.compressor_cls.capabilities.supports_target_size:
+                result["feasible"] = False
+                result["warnings"].append(f"{self.file_type.value.capitalize()} compression ignores size targets")
+            estimates.append(result)
+        return {"method": "model", "duration": None, "estimates": estimates}
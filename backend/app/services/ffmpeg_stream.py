@@ -0,0 +1,301 @@
+"""Pipe-based FFmpeg streaming without intermediate files."""
+import asyncio
+import tempfile
+from collections import deque
+from pathlib import Path
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+import aiofiles
+import ffmpeg
+from app.config import settings
+from app.utils.scratch import owner_prefix, scratch
+
+READ_SIZE = 64 * 1024
+
+# Containers whose index may sit after the media data (ISO BMFF)
+ISO_BMFF_SUFFIXES = {".mp4", ".mov", ".m4a"}
+
+
+def needs_seekable_input(suffix: str, head: bytes) -> Optional[bool]:
+    """Decide from the leading bytes whether FFmpeg must be able to seek.
+
+    Returns None when more bytes are needed. MP4/MOV files are only
+    streamable when the 'moov' box precedes 'mdat' (faststart); every
+    other supported container can be decoded from a pipe.
+    """
+    if suffix.lower() not in ISO_BMFF_SUFFIXES:
+        return False
+    pos = 0
+    while pos + 8 <= len(head):
+        size = int.from_bytes(head[pos:pos + 4], 'big')
+        box_type = head[pos + 4:pos + 8]
+        if box_type == b'moov':
+            return False
+        if box_type == b'mdat':
+            return True
+        if size == 1:
+            if pos + 16 > len(head):
+                return None
+            size = int.from_bytes(head[pos + 8:pos + 16], 'big')
+        if size < 8:
+            # Box extends to end of file or is malformed; FFmpeg will need to seek
+            return True
+        pos += size
+    return None
+
+
+async def read_container_head(chunks: AsyncIterator[bytes], suffix: str) -> Tuple[bytes, bool]:
+    """Read just enough of a stream to tell whether it needs seeking."""
+    head = b""
+    async for chunk in chunks:
+        head += chunk
+        decision = needs_seekable_input(suffix, head)
+        if decision is not None:
+            return head, decision
+        if len(head) >= settings.STREAM_PROBE_BYTES:
+            return head, True
+    decision = needs_seekable_input(suffix, head)
+    return head, True if decision is None else decision
+
+
+async def prepend(head: bytes, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Yield already-read bytes followed by the rest of the stream."""
+    if head:
+        yield head
+    async for chunk in chunks:
+        yield chunk
+
+
+async def limit_size(chunks: AsyncIterator[bytes], max_size: int) -> AsyncIterator[bytes]:
+    """Pass chunks through, failing once more than max_size bytes arrive."""
+    total = 0
+    async for chunk in chunks:
+        total += len(chunk)
+        if total > max_size:
+            raise ValueError(f"Input exceeds {max_size} bytes")
+        yield chunk
+
+
+async def spill_to_disk(chunks: AsyncIterator[bytes], suffix: str, directory: Path) -> Path:
+    """Write a stream to directory for inputs that FFmpeg has to seek in."""
+    with tempfile.NamedTemporaryFile(dir=directory, prefix=owner_prefix(), suffix=suffix, delete=False) as f:
+        path = Path(f.name)
+    try:
+        async with aiofiles.open(path, 'wb') as f:
+            async for chunk in chunks:
+                await f.write(chunk)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    return path
+
+
+class _OutputSpool:
+    """FIFO between FFmpeg's stdout and the HTTP response.
+
+    Holds up to memory_limit bytes in memory. Writers that must not block
+    (while FFmpeg is still consuming upload bytes) overflow to a temporary
+    file in directory instead, so a client that only reads the response
+    after finishing its upload cannot deadlock the pipeline. The file holds
+    at most max_file_bytes unread bytes, which the owner may lower once part
+    of its scratch reservation is taken by other files.
+    """
+
+    def __init__(self, memory_limit: int, directory: Path, max_file_bytes: int):
+        self.memory_limit = memory_limit
+        self.directory = directory
+        self.max_file_bytes = max_file_bytes
+        self._chunks: Deque[bytes] = deque()
+        self._buffered = 0
+        self._file = None
+        self._file_read_pos = 0
+        self._file_pending = 0
+        self._eof = False
+        self._changed = asyncio.Condition()
+
+    async def put(self, chunk: bytes, block: bool) -> None:
+        async with self._changed:
+            if block:
+                await self._changed.wait_for(
+                    lambda: not self._file_pending and self._buffered < self.memory_limit
+                )
+            if self._file_pending or self._buffered >= self.memory_limit:
+                if self._file_pending + len(chunk) > self.max_file_bytes:
+                    raise ValueError(f"Buffered output exceeds {self.max_file_bytes} bytes")
+                if self._file is None:
+                    self._file = tempfile.TemporaryFile(dir=self.directory)
+                self._file.seek(0, 2)
+                self._file.write(chunk)
+                self._file_pending += len(chunk)
+            else:
+                self._chunks.append(chunk)
+                self._buffered += len(chunk)
+            self._changed.notify_all()
+
+    async def get(self) -> Optional[bytes]:
+        """Next chunk in order, or None after close() once drained."""
+        async with self._changed:
+            await self._changed.wait_for(lambda: self._chunks or self._file_pending or self._eof)
+            if self._chunks:
+                chunk = self._chunks.popleft()
+                self._buffered -= len(chunk)
+            elif self._file_pending:
+                self._file.seek(self._file_read_pos)
+                chunk = self._file.read(min(self._file_pending, READ_SIZE))
+                self._file_read_pos += len(chunk)
+                self._file_pending -= len(chunk)
+                if not self._file_pending:
+                    self._file.seek(0)
+                    self._file.truncate()
+                    self._file_read_pos = 0
+            else:
+                return None
+            self._changed.notify_all()
+            return chunk
+
+    async def close(self) -> None:
+        async with self._changed:
+            self._eof = True
+            self._changed.notify_all()
+
+    def discard(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class FFmpegPipe:
+    """Runs FFmpeg with its input fed from a stream and its output streamed back.
+
+    Input backpressure: chunks are only pulled from the source after the
+    previous write to FFmpeg's stdin has drained. Output backpressure: once
+    the input is fully written, FFmpeg's stdout is only read as fast as the
+    consumer takes chunks from iter_output().
+    """
+
+    active = 0
+
+    def __init__(self, output_args: Dict[str, Any], input_size: int):
+        """Takes one of the MAX_CONCURRENT_STREAMS slots and reserves scratch
+        space for input_size bytes, both until close().
+
+        Raises InsufficientSpaceError if the scratch space is not available.
+        """
+        self.output_args = output_args
+        # Holds the spilled input and output that overflows the memory buffer
+        self.workspace = scratch.acquire(input_size)
+        self.input_path: Optional[Path] = None
+        # Output may be larger than its input; it can use the whole reservation
+        self._spool = _OutputSpool(
+            settings.STREAM_BUFFER_BYTES, self.workspace, scratch.required_space(input_size)
+        )
+        self._input_done = asyncio.Event()
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._tasks = []
+        self._stderr_task: Optional[asyncio.Task] = None
+        self._feed_error: Optional[BaseException] = None
+        self._pump_error: Optional[BaseException] = None
+        self._stderr = b""
+        self._closed = False
+        # Counted from construction so a slot is held while the input is still being read
+        FFmpegPipe.active += 1
+
+    async def start(self, chunks: Optional[AsyncIterator[bytes]] = None) -> None:
+        """Launch FFmpeg; chunks are fed to stdin unless input_path was given."""
+        if self.input_path is not None:
+            # The spilled input shares the workspace reservation with overflowed output
+            self._spool.max_file_bytes -= self.input_path.stat().st_size
+        args = (
+            ffmpeg
+            .input(str(self.input_path) if self.input_path else 'pipe:0')
+            .output('pipe:1', **self.output_args)
+            .global_args('-loglevel', 'error')
+            .compile()
+        )
+        self._process = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.PIPE if chunks is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        if chunks is not None:
+            self._tasks.append(asyncio.create_task(self._feed(chunks)))
+        else:
+            self._input_done.set()
+        self._stderr_task = asyncio.create_task(self._drain_stderr())
+        self._tasks.append(asyncio.create_task(self._pump()))
+        self._tasks.append(self._stderr_task)
+
+    async def _feed(self, chunks: AsyncIterator[bytes]) -> None:
+        stdin = self._process.stdin
+        try:
+            async for chunk in chunks:
+                stdin.write(chunk)
+                await stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # FFmpeg exited early; its exit status reports why
+            pass
+        except Exception as e:
+            self._feed_error = e
+            self._process.kill()
+        finally:
+            self._input_done.set()
+            try:
+                stdin.close()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    async def _pump(self) -> None:
+        try:
+            while True:
+                chunk = await self._process.stdout.read(READ_SIZE)
+                if not chunk:
+                    break
+                await self._spool.put(chunk, block=self._input_done.is_set())
+        except ValueError as e:
+            self._pump_error = e
+            self._process.kill()
+        finally:
+            await self._spool.close()
+
+    async def _drain_stderr(self) -> None:
+        # Keep only the tail; an undrained stderr pipe would stall FFmpeg
+        while True:
+            chunk = await self._process.stderr.read(READ_SIZE)
+            if not chunk:
+                break
+            self._stderr = (self._stderr + chunk)[-4096:]
+
+    async def iter_output(self) -> AsyncIterator[bytes]:
+        """Yield encoded output; raises RuntimeError if FFmpeg fails."""
+        try:
+            while True:
+                chunk = await self._spool.get()
+                if chunk is None:
+                    break
+                yield chunk
+            returncode = await self._process.wait()
+            await self._stderr_task
+            if self._feed_error is not None:
+                raise RuntimeError(f"Input error: {self._feed_error}")
+            if self._pump_error is not None:
+                raise RuntimeError(f"Output error: {self._pump_error}")
+            if returncode != 0:
+                raise RuntimeError(f"FFmpeg error: {self._stderr.decode(errors='replace')}")
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        """Stop FFmpeg and release buffers, the workspace and the stream slot; safe to repeat."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._process is not None and self._process.returncode is None:
+            self._process.kill()
+            await self._process.wait()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._spool.discard()
+        scratch.release(self.workspace)
+        self._process = None
+        FFmpegPipe.active -= 1
@@ -2,28 +2,51 @@
 from pathlib import Path
 from PIL import Image
 import io
-from app.models import CompressionStrategy, CompressionRequest
+from app.models import CompressionStrategy, CompressionRequest, FileType
+from .base import BaseCompressor, CompressorCapabilities, ExecutionPool
+from .registry import registry
+from .animation import AnimatedImageCompressor
 
+# Formats whose encoders honour the quality setting
+LOSSY_FORMATS = {'JPEG', 'WEBP'}
+ANIMATED_FORMATS = {'GIF', 'WEBP'}
 
-class ImageCompressor:
+
+def flatten_to_rgb(img: Image.Image, background=(255, 255, 255)) -> Image.Image:
+    """Composite an image with transparency onto a solid background."""
+    if img.mode in ('P', 'LA'):
+        img = img.convert('RGBA')
+    if img.mode != 'RGBA':
+        return img.convert('RGB')
+    rgb_img = Image.new('RGB', img.size, background)
+    rgb_img.paste(img, mask=img.split()[-1])
+    return rgb_img
+
+
+@registry.register(FileType.IMAGE)
+class ImageCompressor(BaseCompressor):
     """Handles image compression using various strategies."""
     
-    def __init__(self, input_path: Path, output_path: Path):
-        self.input_path = input_path
-        self.output_path = output_path
-        self.original_size = input_path.stat().st_size
+    capabilities = CompressorCapabilities(
+        supports_target_size=True,
+        supports_streaming=False,
+        pool=ExecutionPool.CPU,
+        base_cost=0.05,
+        cost_per_mb=0.3,
+    )
     
     def compress(self, request: CompressionRequest) -> Path:
         """Compress image based on strategy."""
-        img = Image.open(self.input_path)
+        img = Image.open(self.source.open())
+        
+        if getattr(img, 'is_animated', False) and img.format in ANIMATED_FORMATS:
+            return AnimatedImageCompressor(
+                img, self.output_path, self.original_size, self.source.spill_dir
+            ).compress(request)
         
         # Convert RGBA to RGB if saving as JPEG
         if img.mode in ('RGBA', 'LA', 'P') and self.output_path.suffix.lower() in ['.jpg', '.jpeg']:
-            rgb_img = Image.new('RGB', img.size, (255, 255, 255))
-            if img.mode == 'P':
-                img = img.convert('RGBA')
-            rgb_img.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-            img = rgb_img
+            img = flatten_to_rgb(img)
         
         if request.strategy == CompressionStrategy.QUALITY:
             return self._compress_by_quality(img, request.quality)
@@ -55,6 +78,9 @@ class ImageCompressor:
         # Start with high quality and reduce until target size is reached
         quality = 95
         min_quality = 10
+        if (img.format or 'JPEG') not in LOSSY_FORMATS:
+            # Quality is ignored by lossless encoders (PNG, GIF, ...); one try is enough
+            min_quality = quality
         
         while quality >= min_quality:
             buffer = io.BytesIO()
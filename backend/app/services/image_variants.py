@@ -0,0 +1,115 @@
+"""Multi-variant image derivative generation."""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+from PIL import Image
+from app.models import FileType, ImageFormat, ImageVariant
+from app.utils.storage import get_output_storage
+from .base import CompressionSource, SourceData
+from .image_compressor import flatten_to_rgb
+from .registry import registry
+
+EXTENSIONS = {
+    ImageFormat.JPEG: "jpg",
+    ImageFormat.WEBP: "webp",
+    ImageFormat.PNG: "png",
+}
+
+
+def _save_params(variant: ImageVariant) -> dict:
+    if variant.format == ImageFormat.JPEG:
+        return {'format': 'JPEG', 'quality': variant.quality, 'optimize': True, 'progressive': True}
+    if variant.format == ImageFormat.WEBP:
+        return {'format': 'WEBP', 'quality': variant.quality, 'method': 4}
+    return {'format': 'PNG', 'optimize': True}
+
+
+def fit_size(size: Tuple[int, int], max_width: Optional[int], max_height: Optional[int]) -> Tuple[int, int]:
+    """Scale a size down to fit within the bounds, keeping the aspect ratio."""
+    width, height = size
+    scale = min(
+        1.0,
+        max_width / width if max_width else 1.0,
+        max_height / height if max_height else 1.0,
+    )
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+class ImageVariantGenerator:
+    """Builds several sizes and formats of an image from a single decode."""
+
+    def __init__(self, source: Union[CompressionSource, SourceData], base_name: str):
+        self.source = CompressionSource.coerce(source)
+        self.base_name = Path(base_name).stem
+
+    def estimate_cost(self, variants: List[ImageVariant]) -> float:
+        """Scheduler cost: one decode plus one encode per variant, scaled by its pixel count."""
+        compressor = registry.get(FileType.IMAGE)
+        size = self.source.size or 0
+        # Only the header is read here
+        with Image.open(self.source.open()) as img:
+            full_size = img.size
+        cost = compressor.estimate_cost(size)
+        for variant in variants:
+            width, height = fit_size(full_size, variant.max_width, variant.max_height)
+            cost += compressor.estimate_cost(int(size * width * height / (full_size[0] * full_size[1])))
+        return cost
+
+    def generate(self, variants: List[ImageVariant], threads: int = 1) -> Tuple[Tuple[int, int], List[dict]]:
+        """Decode, resize and encode all variants; returns the source size and outputs.
+
+        Encodes run on up to threads threads, which the caller must have
+        reserved from the scheduler.
+        """
+        img = Image.open(self.source.open())
+        img.load()
+
+        has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+        bases: Dict[str, Image.Image] = {}
+
+        def base_for(mode: str) -> Image.Image:
+            # JPEG variants share one flattened copy instead of flattening per variant
+            if mode not in bases:
+                bases[mode] = flatten_to_rgb(img) if mode == 'RGB' else img.convert('RGBA')
+            return bases[mode]
+
+        # Group target sizes by pixel mode
+        targets: Dict[str, Dict[Tuple[int, int], List[ImageVariant]]] = {}
+        for variant in variants:
+            mode = 'RGBA' if has_alpha and variant.format != ImageFormat.JPEG else 'RGB'
+            size = fit_size(img.size, variant.max_width, variant.max_height)
+            targets.setdefault(mode, {}).setdefault(size, []).append(variant)
+
+        # Pillow releases the GIL while encoding, so variants encode in parallel
+        # threads; the calling thread only waits for them
+        with ThreadPoolExecutor(threads, thread_name_prefix="variant-encode") as pool:
+            futures = []
+            for mode, sizes in targets.items():
+                # Resize pyramid: each level is resampled from the next larger one
+                level = base_for(mode)
+                for size in sorted(sizes, key=lambda s: s[0] * s[1], reverse=True):
+                    if size != level.size:
+                        level = level.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+                    for variant in sizes[size]:
+                        futures.append(pool.submit(self._encode, level, variant))
+            results = [future.result() for future in futures]
+
+        # Report outputs in request order
+        order = {variant.name: index for index, variant in enumerate(variants)}
+        outputs = sorted(results, key=lambda output: order[output["name"]])
+        return img.size, outputs
+
+    def _encode(self, img: Image.Image, variant: ImageVariant) -> dict:
+        """Encode one variant into output storage."""
+        filename = f"{self.base_name}_{variant.name}.{EXTENSIONS[variant.format]}"
+        with get_output_storage().staging(filename) as output_path:
+            img.save(output_path, **_save_params(variant))
+            size = output_path.stat().st_size
+        return {
+            "name": variant.name,
+            "format": variant.format,
+            "width": img.width,
+            "height": img.height,
+            "size": size,
+            "filename": filename,
+        }
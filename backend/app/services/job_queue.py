@@ -0,0 +1,408 @@
+"""Job queue backends for running compression on separate worker nodes."""
+import json
+import sqlite3
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+try:
+    import redis
+except ImportError:
+    redis = None
+from app.models import JobStatus
+from app.config import settings
+
+
+@dataclass
+class Job:
+    """A compression job shared between API and worker nodes."""
+    file_type: str
+    input_key: str
+    output_key: str
+    request: Dict[str, Any]
+    job_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: JobStatus = JobStatus.PENDING
+    attempts: int = 0
+    max_attempts: int = 3
+    worker_id: Optional[str] = None
+    lease_expires: float = 0.0
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Job":
+        job = cls(**data)
+        job.status = JobStatus(job.status)
+        return job
+
+    def release(self, error: str) -> None:
+        """Give up the current lease, retrying unless attempts are exhausted."""
+        self.error = error
+        self.worker_id = None
+        self.lease_expires = 0.0
+        self.status = JobStatus.PENDING if self.attempts < self.max_attempts else JobStatus.FAILED
+
+
+class JobQueue(ABC):
+    """At-least-once job queue with leases.
+
+    A claimed job is leased to one worker. Workers extend the lease with
+    heartbeats; when a lease expires the job becomes claimable again, so a
+    job may run more than once and compressors must be safe to re-run.
+    """
+
+    @abstractmethod
+    def enqueue(self, job: Job) -> Job:
+        """Add a job to the queue."""
+
+    @abstractmethod
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[Job]:
+        """Lease the oldest pending job to a worker."""
+
+    @abstractmethod
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        """Extend a lease; returns False if the worker no longer owns the job."""
+
+    @abstractmethod
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+        """Mark a job as completed with its result.
+
+        Returns False, and changes nothing, if the worker no longer owns the job.
+        """
+
+    @abstractmethod
+    def fail(self, job_id: str, worker_id: str, error: str) -> Optional[Job]:
+        """Record a failure; the job is retried until max_attempts is reached.
+
+        Returns the updated job, or None if the worker no longer owned it.
+        """
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Job]:
+        """Look up a job by id."""
+
+    @abstractmethod
+    def requeue_expired(self) -> List[Job]:
+        """Return jobs with expired leases to the pending state.
+
+        Returns the released jobs; those out of attempts are FAILED instead.
+        """
+
+    @abstractmethod
+    def pending_count(self) -> int:
+        """Number of jobs waiting to be claimed."""
+
+
+class SQLiteJobQueue(JobQueue):
+    """Job queue stored in a SQLite database, for API and workers on one host."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    worker_id TEXT,
+                    lease_expires REAL NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    data TEXT NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+            conn.commit()
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # A short-lived connection per operation keeps this safe across threads and processes
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _save(self, conn: sqlite3.Connection, job: Job) -> None:
+        job.updated_at = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO jobs (job_id, status, worker_id, lease_expires, created_at, data) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (job.job_id, job.status.value, job.worker_id, job.lease_expires, job.created_at,
+             json.dumps(asdict(job))),
+        )
+
+    def _load(self, conn: sqlite3.Connection, job_id: str) -> Optional[Job]:
+        row = conn.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return Job.from_dict(json.loads(row["data"])) if row else None
+
+    def enqueue(self, job: Job) -> Job:
+        with self._transaction() as conn:
+            self._save(conn, job)
+        return job
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[Job]:
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT job_id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1",
+                (JobStatus.PENDING.value,),
+            ).fetchone()
+            if row is None:
+                return None
+            job = self._load(conn, row["job_id"])
+            job.status = JobStatus.RUNNING
+            job.worker_id = worker_id
+            job.attempts += 1
+            job.lease_expires = time.time() + lease_seconds
+            self._save(conn, job)
+            return job
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        with self._transaction() as conn:
+            job = self._load(conn, job_id)
+            if job is None or job.status != JobStatus.RUNNING or job.worker_id != worker_id:
+                return False
+            job.lease_expires = time.time() + lease_seconds
+            self._save(conn, job)
+            return True
+
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+        with self._transaction() as conn:
+            job = self._load(conn, job_id)
+            if job is None or job.status != JobStatus.RUNNING or job.worker_id != worker_id:
+                return False
+            job.status = JobStatus.COMPLETED
+            job.result = result
+            job.error = None
+            job.lease_expires = 0.0
+            self._save(conn, job)
+            return True
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> Optional[Job]:
+        with self._transaction() as conn:
+            job = self._load(conn, job_id)
+            if job is None or job.worker_id != worker_id or job.status != JobStatus.RUNNING:
+                return None
+            job.release(error)
+            self._save(conn, job)
+            return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._transaction() as conn:
+            return self._load(conn, job_id)
+
+    def requeue_expired(self) -> List[Job]:
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT job_id FROM jobs WHERE status = ? AND lease_expires < ?",
+                (JobStatus.RUNNING.value, time.time()),
+            ).fetchall()
+            released = []
+            for row in rows:
+                job = self._load(conn, row["job_id"])
+                job.release("Lease expired")
+                self._save(conn, job)
+                released.append(job)
+            return released
+
+    def pending_count(self) -> int:
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) AS n FROM jobs WHERE status = ?", (JobStatus.PENDING.value,)
+            ).fetchone()
+            return row["n"]
+
+
+class RedisJobQueue(JobQueue):
+    """Job queue on a Redis-compatible server.
+
+    Pending job ids live in a list, claimed ids are moved to a processing
+    list and their lease deadlines are kept in a sorted set. Every state
+    change runs as a WATCH/MULTI transaction on the job's key.
+    Any client exposing the redis-py API (for example a local stand-in
+    server) can be passed in.
+    """
+
+    def __init__(self, client=None, url: Optional[str] = None, prefix: str = "compress"):
+        if client is None:
+            if redis is None:
+                raise RuntimeError("The redis package is required for the redis queue backend")
+            client = redis.Redis.from_url(url or settings.QUEUE_REDIS_URL, decode_responses=True)
+        self.client = client
+        self.pending_key = f"{prefix}:pending"
+        self.processing_key = f"{prefix}:processing"
+        self.leases_key = f"{prefix}:leases"
+        self.job_prefix = f"{prefix}:job:"
+
+    def _save(self, job: Job, pipe=None) -> None:
+        job.updated_at = time.time()
+        (pipe or self.client).set(self.job_prefix + job.job_id, json.dumps(asdict(job)))
+
+    def _load(self, client, job_id: str) -> Optional[Job]:
+        data = client.get(self.job_prefix + job_id)
+        if data is None:
+            return None
+        if isinstance(data, bytes):
+            data = data.decode()
+        return Job.from_dict(json.loads(data))
+
+    def _transaction(self, func: Callable[[Any], Any], *keys: str) -> Any:
+        """Run func(pipe) with keys WATCHed, retrying if another client changes them.
+
+        func reads through the pipe, then calls pipe.multi() and queues its
+        writes, which are applied atomically.
+        """
+        return self.client.transaction(func, *keys, value_from_callable=True)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._load(self.client, job_id)
+
+    def enqueue(self, job: Job) -> Job:
+        pipe = self.client.pipeline()
+        self._save(job, pipe)
+        pipe.lpush(self.pending_key, job.job_id)
+        pipe.execute()
+        return job
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[Job]:
+        def claim_next(pipe) -> Optional[Job]:
+            job_id = pipe.lindex(self.pending_key, -1)
+            if job_id is None:
+                return None
+            if isinstance(job_id, bytes):
+                job_id = job_id.decode()
+            pipe.watch(self.job_prefix + job_id)
+            job = self._load(pipe, job_id)
+            pipe.multi()
+            pipe.rpop(self.pending_key)
+            if job is None or job.status != JobStatus.PENDING:
+                # Stale duplicate entry from an earlier requeue
+                return False
+            job.status = JobStatus.RUNNING
+            job.worker_id = worker_id
+            job.attempts += 1
+            job.lease_expires = time.time() + lease_seconds
+            # Moving the id, saving the job and taking the lease happen together,
+            # so a worker dying mid-claim cannot leave a job without a lease
+            pipe.lpush(self.processing_key, job_id)
+            self._save(job, pipe)
+            pipe.zadd(self.leases_key, {job_id: job.lease_expires})
+            return job
+
+        while True:
+            job = self._transaction(claim_next, self.pending_key)
+            if job is not False:
+                return job
+
+    def _update(self, job_id: str, func: Callable[[Job, Any], Any]) -> Any:
+        """Load a job and apply func(job, pipe) atomically; None if it does not exist."""
+        def update(pipe) -> Any:
+            job = self._load(pipe, job_id)
+            if job is None:
+                return None
+            pipe.multi()
+            return func(job, pipe)
+
+        return self._transaction(update, self.job_prefix + job_id)
+
+    @staticmethod
+    def _owned(job: Job, worker_id: str) -> bool:
+        return job.status == JobStatus.RUNNING and job.worker_id == worker_id
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        def extend(job: Job, pipe) -> bool:
+            if not self._owned(job, worker_id):
+                return False
+            job.lease_expires = time.time() + lease_seconds
+            self._save(job, pipe)
+            pipe.zadd(self.leases_key, {job_id: job.lease_expires})
+            return True
+
+        return bool(self._update(job_id, extend))
+
+    def _finish(self, job: Job, pipe, requeue: bool) -> None:
+        self._save(job, pipe)
+        pipe.zrem(self.leases_key, job.job_id)
+        pipe.lrem(self.processing_key, 1, job.job_id)
+        if requeue:
+            pipe.lpush(self.pending_key, job.job_id)
+
+    def complete(self, job_id: str, worker_id: str, result: Dict[str, Any]) -> bool:
+        def finish(job: Job, pipe) -> bool:
+            if not self._owned(job, worker_id):
+                return False
+            job.status = JobStatus.COMPLETED
+            job.result = result
+            job.error = None
+            job.lease_expires = 0.0
+            self._finish(job, pipe, requeue=False)
+            return True
+
+        return bool(self._update(job_id, finish))
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> Optional[Job]:
+        def release(job: Job, pipe) -> Optional[Job]:
+            if not self._owned(job, worker_id):
+                return None
+            self._release(job, pipe, error)
+            return job
+
+        return self._update(job_id, release)
+
+    def _release(self, job: Job, pipe, error: str) -> None:
+        job.release(error)
+        self._finish(job, pipe, requeue=job.status == JobStatus.PENDING)
+
+    def requeue_expired(self) -> List[Job]:
+        now = time.time()
+
+        def expire(job: Job, pipe) -> Optional[Job]:
+            if job.status != JobStatus.RUNNING:
+                pipe.zrem(self.leases_key, job.job_id)
+                return None
+            if job.lease_expires >= now:
+                # Extended by a heartbeat since the scan
+                return None
+            self._release(job, pipe, "Lease expired")
+            return job
+
+        released = []
+        for job_id in self.client.zrangebyscore(self.leases_key, 0, now):
+            if isinstance(job_id, bytes):
+                job_id = job_id.decode()
+            if not self.client.exists(self.job_prefix + job_id):
+                self.client.zrem(self.leases_key, job_id)
+                continue
+            job = self._update(job_id, expire)
+            if job is not None:
+                released.append(job)
+        return released
+
+    def pending_count(self) -> int:
+        return self.client.llen(self.pending_key)
+
+
+@lru_cache
+def get_job_queue() -> JobQueue:
+    """Return the job queue configured in settings."""
+    if settings.QUEUE_BACKEND == "redis":
+        return RedisJobQueue(url=settings.QUEUE_REDIS_URL)
+    if settings.QUEUE_BACKEND == "sqlite":
+        return SQLiteJobQueue(settings.QUEUE_SQLITE_PATH)
+    raise ValueError(f"Unknown queue backend: {settings.QUEUE_BACKEND}")
@@ -0,0 +1,39 @@
+"""Compression pipeline shared by the API and worker nodes."""
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Optional, Tuple, Union
+from app.models import CompressionRequest, FileType
+from app.utils.scratch import scratch
+from app.utils.storage import get_output_storage
+from .base import CompressionSource, SourceData
+from .registry import registry
+
+
+def compress_to_storage(
+    file_type: FileType,
+    source: Union[CompressionSource, SourceData],
+    output_key: str,
+    compression_request: CompressionRequest,
+    workspace: Optional[Path] = None,
+) -> Tuple[str, int]:
+    """Compress a source and publish the result to output storage.
+
+    Blocking; run it in a worker pool. Returns the stored key, which differs
+    from output_key when the compressor switched to another output format,
+    and the compressed size in bytes. Pass a workspace from scratch if the
+    caller already reserved one for this job; otherwise one is reserved here.
+    """
+    source = CompressionSource.coerce(source)
+    storage = get_output_storage()
+    reservation = nullcontext(workspace) if workspace is not None else scratch.workspace(source.size or 0)
+    with reservation as workspace:
+        # Spilled input and other intermediates live in the job's workspace
+        source.spill_dir = workspace
+        with storage.staging(output_key, workspace) as output_path:
+            with registry.create(file_type, source, output_path) as compressor:
+                compressed_path = compressor.compress(compression_request)
+            compressed_size = compressed_path.stat().st_size
+            if compressed_path != output_path:
+                output_key = Path(output_key).with_suffix(compressed_path.suffix).name
+                storage.publish(output_key, compressed_path)
+            return output_key, compressed_size
@@ -0,0 +1,42 @@
+"""Registry mapping file types to compressor implementations."""
+from pathlib import Path
+from typing import Callable, Dict, List, Type, Union
+from app.models import FileType
+from .base import BaseCompressor, CompressionSource, CompressorCapabilities, SourceData
+
+
+class CompressorRegistry:
+    """Keeps track of which compressor handles which file type."""
+
+    def __init__(self):
+        self._compressors: Dict[FileType, Type[BaseCompressor]] = {}
+
+    def register(self, file_type: FileType) -> Callable[[Type[BaseCompressor]], Type[BaseCompressor]]:
+        """Class decorator registering a compressor for a file type."""
+        def decorator(compressor_cls: Type[BaseCompressor]) -> Type[BaseCompressor]:
+            self._compressors[file_type] = compressor_cls
+            return compressor_cls
+        return decorator
+
+    def get(self, file_type: FileType) -> Type[BaseCompressor]:
+        """Return the compressor class registered for a file type."""
+        try:
+            return self._compressors[file_type]
+        except KeyError:
+            raise ValueError(f"No compressor registered for file type: {file_type}")
+
+    def create(self, file_type: FileType, source: Union[CompressionSource, SourceData],
+               output_path: Path) -> BaseCompressor:
+        """Instantiate the compressor for a file type."""
+        return self.get(file_type)(source, output_path)
+
+    def capabilities(self, file_type: FileType) -> CompressorCapabilities:
+        """Return the declared capabilities for a file type."""
+        return self.get(file_type).capabilities
+
+    def file_types(self) -> List[FileType]:
+        """Return all file types with a registered compressor."""
+        return list(self._compressors)
+
+
+registry = CompressorRegistry()
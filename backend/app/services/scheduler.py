@@ -0,0 +1,300 @@
+"""Admission control and cost-based scheduling of compression jobs."""
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+from app.models import FileType
+from app.config import settings
+from .base import ExecutionPool
+from .registry import registry
+
+
+class JobClass(str, Enum):
+    """Scheduling classes, each with its own queue and concurrency."""
+    SMALL = "small"
+    MEDIUM = "medium"
+    LARGE = "large"
+
+
+class SchedulerError(Exception):
+    """Raised when a job is rejected before it starts."""
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class RateLimitedError(SchedulerError):
+    """The client exceeded its request rate."""
+    status_code = 429
+
+
+class OverloadedError(SchedulerError):
+    """The queue for the job's class is full."""
+    status_code = 503
+
+
+class TokenBucket:
+    """Token bucket rate limiter."""
+
+    def __init__(self, rate_per_second: float, burst: int):
+        self.rate = rate_per_second
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take one token; return 0 on success or the seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class _ClassQueue:
+    """Per-class queue that round-robins between clients."""
+
+    def __init__(self, job_class: JobClass, concurrency: int, max_queued: int):
+        self.job_class = job_class
+        self.concurrency = concurrency
+        self.max_queued = max_queued
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.avg_cost = 1.0
+        # Per client: futures of waiting jobs and the slots each one needs
+        self._waiters: "OrderedDict[str, Deque[Tuple[asyncio.Future, int]]]" = OrderedDict()
+
+    @property
+    def queued(self) -> int:
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    def enqueue(self, client_id: str, future: asyncio.Future, slots: int = 1) -> None:
+        self._waiters.setdefault(client_id, deque()).append((future, slots))
+
+    def remove(self, client_id: str, future: asyncio.Future) -> None:
+        waiters = self._waiters.get(client_id)
+        if not waiters:
+            return
+        for waiter in waiters:
+            if waiter[0] is future:
+                waiters.remove(waiter)
+                break
+        if not waiters:
+            del self._waiters[client_id]
+
+    def wake_next(self) -> None:
+        """Hand free slots to waiting jobs, one client at a time."""
+        while self._waiters:
+            client_id, waiters = next(iter(self._waiters.items()))
+            future, slots = waiters[0]
+            if not future.done() and self.running + slots > self.concurrency:
+                break
+            waiters.popleft()
+            # Rotate the client to the back so others get the next slot
+            del self._waiters[client_id]
+            if waiters:
+                self._waiters[client_id] = waiters
+            if not future.done():
+                self.running += slots
+                future.set_result(None)
+
+    def expected_wait(self) -> float:
+        """Seconds until a newly queued job would likely start."""
+        return (self.queued + 1) * self.avg_cost / self.concurrency
+
+    def record(self, elapsed: float) -> None:
+        self.completed += 1
+        self.avg_cost = 0.8 * self.avg_cost + 0.2 * elapsed
+
+
+class CompressionScheduler:
+    """Routes compression jobs into weighted per-class queues and worker pools."""
+
+    def __init__(
+        self,
+        concurrency: Dict[str, int],
+        max_queued: Dict[str, int],
+        small_cost: float,
+        large_cost: float,
+        rate_per_minute: int,
+        burst: int,
+    ):
+        self.small_cost = small_cost
+        self.large_cost = large_cost
+        self.rate_per_second = rate_per_minute / 60
+        self.burst = burst
+        self._queues = {
+            job_class: _ClassQueue(job_class, concurrency[job_class.value], max_queued[job_class.value])
+            for job_class in JobClass
+        }
+        # Least recently used first, so idle buckets can be evicted from the front
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        # Each class gets threads for all of its slots, so running large jobs
+        # never hold threads that small jobs are waiting for
+        self._pools = {
+            job_class: {
+                pool: ThreadPoolExecutor(
+                    self._queues[job_class].concurrency,
+                    thread_name_prefix=f"compress-{job_class.value}-{pool.value}",
+                )
+                for pool in ExecutionPool
+            }
+            for job_class in JobClass
+        }
+
+    @classmethod
+    def from_settings(cls) -> "CompressionScheduler":
+        return cls(
+            concurrency=settings.SCHEDULER_CLASS_CONCURRENCY,
+            max_queued=settings.SCHEDULER_MAX_QUEUED,
+            small_cost=settings.SCHEDULER_SMALL_JOB_COST,
+            large_cost=settings.SCHEDULER_LARGE_JOB_COST,
+            rate_per_minute=settings.RATE_LIMIT_PER_MINUTE,
+            burst=settings.RATE_LIMIT_BURST,
+        )
+
+    def estimate_cost(self, file_type: FileType, size: int, duration: Optional[float] = None) -> float:
+        """Estimate job cost in seconds from the compressor's cost model."""
+        return registry.get(file_type).estimate_cost(size, duration)
+
+    def classify(self, cost: float) -> JobClass:
+        if cost <= self.small_cost:
+            return JobClass.SMALL
+        if cost >= self.large_cost:
+            return JobClass.LARGE
+        return JobClass.MEDIUM
+
+    def check_rate_limit(self, client_id: str) -> None:
+        """Consume one request from the client's budget or raise RateLimitedError.
+
+        A rate of 0 disables rate limiting.
+        """
+        if self.rate_per_second <= 0:
+            return
+        self._evict_idle_buckets()
+        bucket = self._buckets.pop(client_id, None)
+        if bucket is None:
+            bucket = TokenBucket(self.rate_per_second, self.burst)
+        self._buckets[client_id] = bucket
+        wait = bucket.take()
+        if wait:
+            raise RateLimitedError("Rate limit exceeded", retry_after=wait)
+
+    def _evict_idle_buckets(self) -> None:
+        # A bucket idle long enough to refill completely is the same as a new one
+        idle_after = self.burst / self.rate_per_second
+        now = time.monotonic()
+        while self._buckets:
+            bucket = next(iter(self._buckets.values()))
+            if now - bucket.updated < idle_after:
+                break
+            self._buckets.popitem(last=False)
+
+    def _admit(self, cost: float) -> _ClassQueue:
+        """Pick the class queue for a job, or raise OverloadedError if it is full."""
+        queue = self._queues[self.classify(cost)]
+        if queue.queued >= queue.max_queued and (queue.running >= queue.concurrency or queue.queued):
+            queue.rejected += 1
+            raise OverloadedError(
+                f"Too many {queue.job_class.value} jobs queued",
+                retry_after=queue.expected_wait(),
+            )
+        return queue
+
+    def max_slots(self, cost: float) -> int:
+        """Most slots one job of this cost can take: its class's concurrency."""
+        return self._queues[self.classify(cost)].concurrency
+
+    def check_capacity(self, file_type: FileType, size: int, duration: Optional[float] = None) -> None:
+        """Raise OverloadedError if a job like this would be turned away right now.
+
+        Lets callers fail fast before expensive preparation such as probing.
+        """
+        self._admit(self.estimate_cost(file_type, size, duration))
+
+    async def submit(
+        self,
+        client_id: str,
+        file_type: FileType,
+        size: int,
+        func: Callable[..., Any],
+        *args: Any,
+        duration: Optional[float] = None,
+        cost: Optional[float] = None,
+        slots: int = 1,
+    ) -> Any:
+        """Admit a job, wait for a slot in its class and run it in the matching pool.
+
+        Callers check the client's rate limit with check_rate_limit() first,
+        before doing any work for the request. cost overrides the size-based
+        estimate for jobs that only touch part of the input, such as dry-run
+        estimates. Jobs that run several threads of their own take one slot
+        per thread; slots must not exceed max_slots(cost).
+        """
+        if cost is None:
+            cost = self.estimate_cost(file_type, size, duration)
+        queue = self._admit(cost)
+        if slots > queue.concurrency:
+            raise ValueError(f"A {queue.job_class.value} job can take at most {queue.concurrency} slots")
+
+        if queue.running + slots > queue.concurrency or queue.queued:
+            future = asyncio.get_running_loop().create_future()
+            queue.enqueue(client_id, future, slots)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # A slot was granted just before cancellation
+                    queue.running -= slots
+                    queue.wake_next()
+                else:
+                    queue.remove(client_id, future)
+                raise
+        else:
+            queue.running += slots
+
+        pool = self._pools[queue.job_class][registry.capabilities(file_type).pool]
+        started = time.monotonic()
+        try:
+            job = asyncio.get_running_loop().run_in_executor(pool, func, *args)
+        except BaseException:
+            self._release(queue, slots, started)
+            raise
+        # Free the slots when the thread finishes, not when the caller stops waiting
+        job.add_done_callback(lambda job: self._release(queue, slots, started, job))
+        return await asyncio.shield(job)
+
+    def _release(self, queue: _ClassQueue, slots: int, started: float,
+                 job: Optional[asyncio.Future] = None) -> None:
+        if job is not None and not job.cancelled():
+            # Retrieve the outcome so an abandoned job's error is not reported as unhandled
+            job.exception()
+        queue.record(time.monotonic() - started)
+        queue.running -= slots
+        queue.wake_next()
+
+    def state(self) -> Dict[str, Any]:
+        """Snapshot of queue depths and concurrency for each class."""
+        return {
+            job_class.value: {
+                "running": queue.running,
+                "queued": queue.queued,
+                "concurrency": queue.concurrency,
+                "max_queued": queue.max_queued,
+                "completed": queue.completed,
+                "rejected": queue.rejected,
+                "avg_job_seconds": round(queue.avg_cost, 3),
+            }
+            for job_class, queue in self._queues.items()
+        }
+
+
+scheduler = CompressionScheduler.from_settings()
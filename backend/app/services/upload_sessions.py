@@ -0,0 +1,226 @@
+"""Resumable chunked upload sessions."""
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional
+from PIL import Image
+from app.models import FileType
+from app.config import settings
+from app.utils.file_handler import FileHandler
+
+
+class UploadError(Exception):
+    """Base class for rejected chunk writes."""
+    status_code = 400
+
+
+class ChunkOffsetError(UploadError):
+    """The chunk does not start at the session's current offset."""
+    status_code = 409
+
+
+class ChecksumMismatchError(UploadError):
+    """The chunk content does not match its declared checksum."""
+    status_code = 400
+
+
+class UploadSizeError(UploadError):
+    """The chunk would extend the upload beyond its declared size."""
+    status_code = 413
+
+
+@dataclass
+class UploadSession:
+    """State of a resumable upload."""
+    original_filename: str
+    filename: str
+    file_type: FileType
+    size: int
+    upload_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    offset: int = 0
+    probe: Optional[Dict[str, Any]] = None
+    probed_offset: int = 0
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+    @property
+    def complete(self) -> bool:
+        return self.offset >= self.size
+
+
+class UploadSessionManager:
+    """Stores upload sessions as a partial file plus a JSON metadata file.
+
+    Sessions live on the local disk of the API node that created them, so
+    clients must send all chunks of a session to the same node.
+    """
+
+    def __init__(self, directory: Path, ttl_seconds: float):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.ttl_seconds = ttl_seconds
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock(self, upload_id: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def _meta_path(self, upload_id: str) -> Path:
+        return self.directory / f"{Path(upload_id).name}.json"
+
+    def _claim_path(self, upload_id: str) -> Path:
+        return self.directory / f"{Path(upload_id).name}.lock"
+
+    def part_path(self, session: UploadSession) -> Path:
+        """Path of the partially uploaded file."""
+        return self.directory / f"{session.upload_id}.part"
+
+    def _save(self, session: UploadSession) -> None:
+        session.updated_at = time.time()
+        meta_path = self._meta_path(session.upload_id)
+        tmp_path = meta_path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps(asdict(session)))
+        os.replace(tmp_path, meta_path)
+
+    def create(self, original_filename: str, size: int, file_type: FileType) -> UploadSession:
+        """Start a new upload session."""
+        self.expire_stale()
+        session = UploadSession(
+            original_filename=original_filename,
+            filename=FileHandler.generate_unique_filename(original_filename),
+            file_type=file_type,
+            size=size,
+        )
+        self.part_path(session).touch()
+        self._save(session)
+        return session
+
+    def get(self, upload_id: str) -> Optional[UploadSession]:
+        """Load a session, or None if it does not exist."""
+        meta_path = self._meta_path(upload_id)
+        if not meta_path.exists():
+            return None
+        session = UploadSession(**json.loads(meta_path.read_text()))
+        session.file_type = FileType(session.file_type)
+        return session
+
+    def write_chunk(self, upload_id: str, offset: int, data: bytes, sha256: str) -> UploadSession:
+        """Verify and append a chunk at the given offset.
+
+        Re-sending a chunk that was already stored is accepted, so a client
+        that lost the response to a PUT can simply retry it.
+        """
+        with self._lock(upload_id):
+            session = self.get(upload_id)
+            if session is None:
+                raise KeyError(upload_id)
+            if hashlib.sha256(data).hexdigest() != sha256.lower():
+                raise ChecksumMismatchError("Chunk checksum mismatch")
+            if offset + len(data) <= session.offset:
+                return session
+            if offset != session.offset:
+                raise ChunkOffsetError(f"Expected chunk at offset {session.offset}")
+            if offset + len(data) > session.size:
+                raise UploadSizeError("Chunk exceeds the declared upload size")
+
+            with open(self.part_path(session), 'r+b') as f:
+                f.seek(offset)
+                f.write(data)
+            session.offset = offset + len(data)
+            self._save(session)
+            return session
+
+    def start_probe(self, upload_id: str) -> bool:
+        """Claim the next probe attempt once enough leading bytes have arrived.
+
+        Failed attempts are retried only after the upload has doubled in
+        size (or completed), so slow-to-parse files are not probed per chunk.
+        """
+        with self._lock(upload_id):
+            session = self.get(upload_id)
+            if session is None or session.probe is not None:
+                return False
+            threshold = max(settings.UPLOAD_PROBE_BYTES, 2 * session.probed_offset)
+            if session.offset < threshold and not (session.complete and session.probed_offset < session.size):
+                return False
+            session.probed_offset = session.offset
+            self._save(session)
+            return True
+
+    def probe(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        """Inspect the partial file while the rest is still uploading."""
+        session = self.get(upload_id)
+        if session is None:
+            return None
+        path = self.part_path(session)
+        probe: Dict[str, Any] = {}
+        if session.file_type in (FileType.VIDEO, FileType.AUDIO):
+            duration = FileHandler.get_media_duration(path)
+            if duration is not None:
+                probe["duration"] = duration
+        elif session.file_type == FileType.IMAGE:
+            try:
+                with Image.open(path) as img:
+                    probe.update(width=img.width, height=img.height, format=img.format, mode=img.mode)
+            except Exception:
+                pass
+
+        with self._lock(upload_id):
+            session = self.get(upload_id)
+            if session is None:
+                return None
+            # Leave the probe unset so a later chunk retries it
+            if probe or session.probed_offset >= session.size:
+                session.probe = probe
+                self._save(session)
+        return probe
+
+    def claim(self, upload_id: str) -> bool:
+        """Mark a session as being completed; False if a request already did.
+
+        The marker is created with O_EXCL, so only one request wins even
+        when several API processes share the session directory.
+        """
+        try:
+            fd = os.open(self._claim_path(upload_id), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        os.close(fd)
+        return True
+
+    def is_claimed(self, upload_id: str) -> bool:
+        """Whether a request is currently completing the session."""
+        return self._claim_path(upload_id).exists()
+
+    def release(self, upload_id: str) -> None:
+        """Drop a claim so that completing the session can be retried."""
+        self._claim_path(upload_id).unlink(missing_ok=True)
+
+    def discard(self, upload_id: str) -> None:
+        """Remove a session, its partial file and any claim on it."""
+        session = self.get(upload_id)
+        if session is not None:
+            self.part_path(session).unlink(missing_ok=True)
+        self._meta_path(upload_id).unlink(missing_ok=True)
+        self.release(upload_id)
+        with self._locks_guard:
+            self._locks.pop(upload_id, None)
+
+    def expire_stale(self) -> int:
+        """Discard sessions that have not received data within the TTL."""
+        cutoff = time.time() - self.ttl_seconds
+        count = 0
+        for meta_path in self.directory.glob("*.json"):
+            if meta_path.stat().st_mtime < cutoff:
+                self.discard(meta_path.stem)
+                count += 1
+        return count
+
+
+upload_sessions = UploadSessionManager(settings.UPLOAD_DIR / "sessions", settings.UPLOAD_SESSION_TTL)
@@ -1,16 +1,27 @@
 """Video compression service."""
 from pathlib import Path
 import ffmpeg
-from app.models import CompressionStrategy, CompressionRequest
+from app.models import CompressionStrategy, CompressionRequest, FileType
+from .base import BaseCompressor, CompressorCapabilities, ExecutionPool
+from .registry import registry
 
 
-class VideoCompressor:
+@registry.register(FileType.VIDEO)
+class VideoCompressor(BaseCompressor):
     """Handles video compression using FFmpeg."""
     
-    def __init__(self, input_path: Path, output_path: Path):
-        self.input_path = input_path
-        self.output_path = output_path
-        self.original_size = input_path.stat().st_size
+    capabilities = CompressorCapabilities(
+        supports_target_size=True,
+        supports_streaming=True,
+        pool=ExecutionPool.SUBPROCESS,
+        base_cost=0.5,
+        cost_per_mb=0.05,
+        cost_per_media_second=0.5,
+    )
+    stream_formats = {
+        # Fragmented MP4 can be written to a pipe and played while downloading
+        'mp4': ('video/mp4', {'format': 'mp4', 'movflags': 'frag_keyframe+empty_moov+default_base_moof'}),
+    }
     
     def compress(self, request: CompressionRequest) -> Path:
         """Compress video based on strategy."""
@@ -23,24 +34,36 @@ class VideoCompressor:
         
         raise ValueError(f"Unknown compression strategy: {request.strategy}")
     
-    def _compress_by_quality(self, quality: int) -> Path:
-        """Compress video with specified quality using CRF."""
+    AUDIO_BITRATE = 128 * 1024
+    MIN_VIDEO_BITRATE = 100000
+    
+    @classmethod
+    def target_video_bitrate(cls, target_size_bytes: int, duration: float) -> int:
+        """Video bitrate needed to hit a target size, before the minimum is applied."""
+        target_total_bitrate = (target_size_bytes * 8) / duration
+        return int(target_total_bitrate - cls.AUDIO_BITRATE)
+    
+    @classmethod
+    def quality_output_args(cls, quality: int) -> dict:
+        """FFmpeg output options for quality-based compression using CRF."""
         # CRF scale: 0-51, where 0 is lossless and 51 is worst quality
         # Convert quality (1-100) to CRF (51-18)
         crf = int(51 - (quality / 100) * 33)
-        
+        return {
+            'vcodec': 'libx264',
+            'crf': crf,
+            'preset': 'medium',
+            'acodec': 'aac',
+            'audio_bitrate': '128k'
+        }
+    
+    def _compress_by_quality(self, quality: int) -> Path:
+        """Compress video with specified quality using CRF."""
         try:
             (
                 ffmpeg
                 .input(str(self.input_path))
-                .output(
-                    str(self.output_path),
-                    vcodec='libx264',
-                    crf=crf,
-                    preset='medium',
-                    acodec='aac',
-                    audio_bitrate='128k'
-                )
+                .output(str(self.output_path), **self.quality_output_args(quality))
                 .overwrite_output()
                 .run(capture_stdout=True, capture_stderr=True)
             )
@@ -58,12 +81,7 @@ class VideoCompressor:
         duration = float(probe['format']['duration'])
         
         # Calculate target bitrate (accounting for audio)
-        audio_bitrate = 128 * 1024  # 128 kbps
-        target_total_bitrate = (target_size_bytes * 8) / duration
-        video_bitrate = int(target_total_bitrate - audio_bitrate)
-        
-        if video_bitrate < 100000:  # Minimum 100kbps
-            video_bitrate = 100000
+        video_bitrate = max(self.target_video_bitrate(target_size_bytes, duration), self.MIN_VIDEO_BITRATE)
         
         try:
             (
@@ -0,0 +1,101 @@
+"""Worker that pulls compression jobs from the job queue."""
+import logging
+import socket
+import threading
+import uuid
+from typing import Any, Dict, Optional
+from app.models import CompressionRequest, FileType, JobStatus
+from app.config import settings
+from app.utils.scratch import scratch
+from app.utils.storage import get_upload_storage
+from .job_queue import Job, JobQueue
+from .pipeline import compress_to_storage
+
+logger = logging.getLogger(__name__)
+
+
+class CompressionWorker:
+    """Claims jobs, compresses them and publishes results to shared storage."""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        worker_id: Optional[str] = None,
+        lease_seconds: float = settings.JOB_LEASE_SECONDS,
+        poll_interval: float = settings.WORKER_POLL_INTERVAL,
+    ):
+        self.queue = queue
+        self.worker_id = worker_id or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+
+    def stop(self) -> None:
+        """Ask run_forever() to exit after the current job."""
+        self._stop.set()
+
+    def run_forever(self) -> None:
+        """Process jobs until stop() is called."""
+        logger.info("Worker %s started", self.worker_id)
+        while not self._stop.is_set():
+            if not self.run_once():
+                self._stop.wait(self.poll_interval)
+        logger.info("Worker %s stopped", self.worker_id)
+
+    def run_once(self) -> bool:
+        """Process a single job; returns False if the queue was empty."""
+        for expired in self.queue.requeue_expired():
+            self._discard_failed_input(expired)
+        job = self.queue.claim(self.worker_id, self.lease_seconds)
+        if job is None:
+            return False
+
+        logger.info("Worker %s claimed job %s (attempt %d)", self.worker_id, job.job_id, job.attempts)
+        heartbeat_done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, heartbeat_done), daemon=True)
+        heartbeat.start()
+        try:
+            result = self._process(job)
+        except Exception as e:
+            logger.exception("Job %s failed", job.job_id)
+            self._discard_failed_input(self.queue.fail(job.job_id, self.worker_id, str(e)))
+        else:
+            if self.queue.complete(job.job_id, self.worker_id, result):
+                get_upload_storage().delete(job.input_key)
+            else:
+                # The lease expired and the job was handed out again; its input is still needed
+                logger.warning("Worker %s lost job %s before completing it", self.worker_id, job.job_id)
+        finally:
+            heartbeat_done.set()
+            heartbeat.join()
+        return True
+
+    def _discard_failed_input(self, job: Optional[Job]) -> None:
+        """Delete the input of a job that will not be retried."""
+        if job is not None and job.status == JobStatus.FAILED:
+            logger.warning("Job %s failed after %d attempts", job.job_id, job.attempts)
+            get_upload_storage().delete(job.input_key)
+
+    def _heartbeat(self, job: Job, done: threading.Event) -> None:
+        """Extend the job lease periodically while it is being processed."""
+        while not done.wait(self.lease_seconds / 3):
+            if not self.queue.heartbeat(job.job_id, self.worker_id, self.lease_seconds):
+                logger.warning("Worker %s lost the lease on job %s", self.worker_id, job.job_id)
+                return
+
+    def _process(self, job: Job) -> Dict[str, Any]:
+        """Compress a job's input; safe to repeat since outputs are overwritten."""
+        compression_request = CompressionRequest(**job.request)
+        storage = get_upload_storage()
+        # The downloaded input counts against the job's scratch reservation
+        with scratch.workspace(storage.size(job.input_key)) as workspace:
+            with storage.fetch(job.input_key, workspace) as input_path:
+                original_size = input_path.stat().st_size
+                filename, compressed_size = compress_to_storage(
+                    FileType(job.file_type), input_path, job.output_key, compression_request, workspace
+                )
+        return {
+            "original_size": original_size,
+            "compressed_size": compressed_size,
+            "filename": filename,
+        }
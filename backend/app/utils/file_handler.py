@@ -1,8 +1,12 @@
 """File handling utilities."""
+import json
 import os
+import shutil
+import subprocess
 import uuid
 from pathlib import Path
-from typing import Tuple
+from typing import BinaryIO, Optional, Tuple
+import ffmpeg
 try:
     import magic
 except ImportError:
@@ -59,6 +63,48 @@ class FileHandler:
         """Get file size in bytes."""
         return filepath.stat().st_size
     
+    @staticmethod
+    def get_media_duration(filepath: Path) -> Optional[float]:
+        """Probe media duration in seconds, or None if it cannot be determined."""
+        try:
+            probe = ffmpeg.probe(str(filepath))
+            return float(probe['format']['duration'])
+        except (ffmpeg.Error, KeyError, ValueError, FileNotFoundError):
+            return None
+    
+    @staticmethod
+    def get_stream_duration(stream: BinaryIO, size: int) -> Optional[float]:
+        """Probe media duration by piping a seekable stream through ffprobe.
+        
+        Nothing is written to disk and the stream is rewound afterwards.
+        Formats that only state a bitrate up front (WAV, MP3) are timed from
+        size and bitrate.
+        """
+        position = stream.tell()
+        try:
+            process = subprocess.Popen(
+                ['ffprobe', '-v', 'error', '-show_format', '-of', 'json', 'pipe:0'],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            )
+        except FileNotFoundError:
+            return None
+        try:
+            shutil.copyfileobj(stream, process.stdin, 1024 * 1024)
+            process.stdin.close()
+        except (BrokenPipeError, ConnectionResetError):
+            # ffprobe stops reading once it has what it needs
+            pass
+        finally:
+            stream.seek(position)
+        output, _ = process.communicate()
+        try:
+            probe = json.loads(output)['format']
+            if 'duration' in probe:
+                return float(probe['duration'])
+            return size * 8 / float(probe['bit_rate'])
+        except (KeyError, ValueError, ZeroDivisionError):
+            return None
+    
     @staticmethod
     def cleanup_file(filepath: Path) -> None:
         """Remove file if it exists."""
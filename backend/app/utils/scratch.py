@@ -0,0 +1,232 @@
+"""Crash-safe scratch space for compression jobs."""
+import logging
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+SCRATCH_PREFIX = ".scratch_"
+HOSTNAME = socket.gethostname().replace("_", "-")
+RETRY_AFTER = 30.0
+
+
+class InsufficientSpaceError(Exception):
+    """Not enough free space to run a job to completion."""
+    status_code = 507
+
+    def __init__(self, message: str, retry_after: float = RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def owner_prefix() -> str:
+    """Temp-name prefix recording this host and process, so sweep() can spot orphans."""
+    return f"{SCRATCH_PREFIX}{HOSTNAME}_{os.getpid()}_"
+
+
+def _pid_alive(pid: int) -> Optional[bool]:
+    if os.name == 'nt':
+        # Signal 0 is CTRL_C_EVENT on Windows; fall back to the age check
+        return None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def atomic_replace(src: Path, dst: Path) -> None:
+    """Move src to dst so that dst is never seen half-written, even across filesystems."""
+    try:
+        os.replace(src, dst)
+    except OSError:
+        # Different filesystem (e.g. tmpfs -> disk): copy next to dst, then rename
+        with tempfile.NamedTemporaryFile(dir=dst.parent, prefix=owner_prefix(), delete=False) as f:
+            tmp = Path(f.name)
+        try:
+            shutil.copyfile(src, tmp)
+            os.replace(tmp, dst)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        src.unlink(missing_ok=True)
+
+
+class ScratchManager:
+    """Hands out per-job workspaces and keeps volumes from filling up.
+
+    Jobs small enough for the RAM-backed directory stage there, larger ones
+    on TEMP_DIR. Space is reserved when a workspace is opened, so concurrent
+    jobs cannot together overcommit a volume.
+    """
+
+    def __init__(
+        self,
+        disk_dir: Path,
+        tmpfs_dir: Optional[Path],
+        tmpfs_max_job_bytes: int,
+        tmpfs_max_bytes: int,
+        space_factor: float,
+        min_free_bytes: int,
+        orphan_age: float,
+    ):
+        self.disk_dir = Path(disk_dir)
+        self.disk_dir.mkdir(parents=True, exist_ok=True)
+        self.tmpfs_dir = None
+        # Only use the RAM-backed directory where the platform provides one
+        if tmpfs_dir is not None and Path(tmpfs_dir).parent.is_dir():
+            self.tmpfs_dir = Path(tmpfs_dir)
+            self.tmpfs_dir.mkdir(exist_ok=True)
+        self.tmpfs_max_job_bytes = tmpfs_max_job_bytes
+        self.tmpfs_max_bytes = tmpfs_max_bytes
+        self.space_factor = space_factor
+        self.min_free_bytes = min_free_bytes
+        self.orphan_age = orphan_age
+        self._reserved: Dict[Path, int] = {self.disk_dir: 0}
+        self._workspaces: Dict[Path, Tuple[Path, int]] = {}
+        if self.tmpfs_dir is not None:
+            self._reserved[self.tmpfs_dir] = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls) -> "ScratchManager":
+        return cls(
+            disk_dir=settings.TEMP_DIR,
+            tmpfs_dir=settings.SCRATCH_TMPFS_DIR,
+            tmpfs_max_job_bytes=settings.SCRATCH_TMPFS_MAX_JOB_BYTES,
+            tmpfs_max_bytes=settings.SCRATCH_TMPFS_MAX_BYTES,
+            space_factor=settings.SCRATCH_SPACE_FACTOR,
+            min_free_bytes=settings.SCRATCH_MIN_FREE_BYTES,
+            orphan_age=settings.SCRATCH_ORPHAN_AGE,
+        )
+
+    def required_space(self, size: int) -> int:
+        """Scratch bytes a job on an input of this size may need."""
+        return int(size * self.space_factor)
+
+    def _fits_tmpfs(self, needed: int) -> bool:
+        if self.tmpfs_dir is None or needed > self.tmpfs_max_job_bytes:
+            return False
+        reserved = self._reserved[self.tmpfs_dir]
+        return (reserved + needed <= self.tmpfs_max_bytes
+                and shutil.disk_usage(self.tmpfs_dir).free - reserved >= needed)
+
+    def _fits_disk(self, directory: Path, needed: int) -> bool:
+        free = shutil.disk_usage(directory).free - self._reserved.get(directory, 0)
+        return free - needed >= self.min_free_bytes
+
+    def check_free(self, free: Optional[int], size: int) -> None:
+        """Reject storing size bytes where free bytes remain (None means unlimited)."""
+        if free is not None and free - size < self.min_free_bytes:
+            raise InsufficientSpaceError("Not enough free space to store this file")
+
+    def check_directory(self, directory: Path, size: int) -> None:
+        """Reject writing size bytes into a local directory."""
+        self.check_free(shutil.disk_usage(directory).free, size)
+
+    def admit(self, size: int, output_free: Optional[int] = None) -> None:
+        """Fail fast, before queueing, if a job of this input size cannot finish."""
+        needed = self.required_space(size)
+        with self._lock:
+            if not self._fits_tmpfs(needed) and not self._fits_disk(self.disk_dir, needed):
+                raise InsufficientSpaceError("Not enough scratch space to process this file")
+        self.check_free(output_free, size)
+
+    def acquire(self, size: int) -> Path:
+        """Reserve space and create a private directory; hand it back with release()."""
+        needed = self.required_space(size)
+        with self._lock:
+            if self._fits_tmpfs(needed):
+                root = self.tmpfs_dir
+            elif self._fits_disk(self.disk_dir, needed):
+                root = self.disk_dir
+            else:
+                raise InsufficientSpaceError("Not enough scratch space to process this file")
+            self._reserved[root] += needed
+        try:
+            path = Path(tempfile.mkdtemp(prefix=owner_prefix(), dir=root))
+        except BaseException:
+            with self._lock:
+                self._reserved[root] -= needed
+            raise
+        with self._lock:
+            self._workspaces[path] = (root, needed)
+        return path
+
+    def release(self, path: Path) -> None:
+        """Remove a workspace from acquire() and return its reservation."""
+        shutil.rmtree(path, ignore_errors=True)
+        with self._lock:
+            root, needed = self._workspaces.pop(path)
+            self._reserved[root] -= needed
+
+    @contextmanager
+    def workspace(self, size: int) -> Iterator[Path]:
+        """Reserve space and yield a private directory that is removed afterwards."""
+        path = self.acquire(size)
+        try:
+            yield path
+        finally:
+            self.release(path)
+
+    def _is_orphan(self, path: Path, scratch_root: bool) -> bool:
+        try:
+            age = time.time() - path.lstat().st_mtime
+        except FileNotFoundError:
+            return False
+        if not path.name.startswith(SCRATCH_PREFIX):
+            # Only scratch roots are ours to clean wholesale; the rest holds real data
+            return scratch_root and age > self.orphan_age
+        host, _, pid = path.name[len(SCRATCH_PREFIX):].partition("_")
+        pid = pid.partition("_")[0]
+        if host == HOSTNAME and pid.isdigit():
+            alive = _pid_alive(int(pid))
+            if int(pid) == os.getpid() or alive is False:
+                return True
+            if alive:
+                return False
+        return age > self.orphan_age
+
+    def sweep(self, data_dirs: Optional[List[Path]] = None) -> int:
+        """Remove scratch files left behind by crashed processes; run at startup."""
+        roots = [(self.disk_dir, True)]
+        if self.tmpfs_dir is not None:
+            roots.append((self.tmpfs_dir, True))
+        roots += [(Path(directory), False) for directory in data_dirs or []]
+
+        removed = 0
+        for root, scratch_root in roots:
+            if not root.is_dir():
+                continue
+            for path in root.iterdir():
+                if not self._is_orphan(path, scratch_root):
+                    continue
+                if path.is_dir() and not path.is_symlink():
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    path.unlink(missing_ok=True)
+                removed += 1
+        if removed:
+            logger.info("Removed %d orphaned scratch entries", removed)
+        return removed
+
+    def state(self) -> Dict[str, Dict[str, int]]:
+        """Reserved and free bytes per scratch root, for monitoring."""
+        with self._lock:
+            return {
+                str(root): {"reserved": reserved, "free": shutil.disk_usage(root).free}
+                for root, reserved in self._reserved.items()
+            }
+
+
+scratch = ScratchManager.from_settings()
@@ -0,0 +1,248 @@
+"""Storage backends for uploaded and compressed files."""
+import os
+import shutil
+import tempfile
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+try:
+    import boto3
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import ClientError
+    from boto3.s3.transfer import TransferConfig
+except ImportError:
+    boto3 = None
+from app.config import settings
+from .scratch import atomic_replace, owner_prefix
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class Storage(ABC):
+    """A flat namespace of files addressed by key."""
+
+    @abstractmethod
+    def save(self, key: str, stream: BinaryIO) -> int:
+        """Stream data into storage and return the number of bytes stored."""
+
+    @abstractmethod
+    def open(self, key: str) -> BinaryIO:
+        """Open a stored file for streaming reads."""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """Check whether a key exists."""
+
+    @abstractmethod
+    def size(self, key: str) -> int:
+        """Size of a stored file in bytes."""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove a key if it exists."""
+
+    @abstractmethod
+    @contextmanager
+    def fetch(self, key: str, directory: Optional[Path] = None) -> Iterator[Path]:
+        """Provide a local path to read a stored file from.
+
+        Backends that have to download the file place it in directory,
+        normally the job's scratch workspace, or in TEMP_DIR.
+        """
+
+    @abstractmethod
+    def publish(self, key: str, path: Path) -> None:
+        """Move a finished local file into storage under key."""
+
+    @abstractmethod
+    @contextmanager
+    def staging(self, key: str, directory: Optional[Path] = None) -> Iterator[Path]:
+        """Provide a local path to write to; it is stored under key on success if written.
+
+        Backends that upload the file afterwards stage it in directory, like fetch().
+        """
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """Path of the stored file if it lives on the local filesystem."""
+        return None
+
+    def download_url(self, key: str, filename: Optional[str] = None) -> Optional[str]:
+        """Direct download URL, or None if downloads must go through the API."""
+        return None
+
+    def free_bytes(self) -> Optional[int]:
+        """Free space for new files, or None if the backend is not space-limited."""
+        return None
+
+
+class LocalStorage(Storage):
+    """Stores files in a local (or mounted shared) directory."""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        # Keys are flat names; strip any directory components
+        return self.directory / Path(key).name
+
+    def _temp_path(self, key: str) -> Path:
+        # Keeps the extension, which encoders use to pick the output format
+        return self.directory / f"{owner_prefix()}{uuid.uuid4().hex[:8]}_{Path(key).name}"
+
+    def save(self, key: str, stream: BinaryIO) -> int:
+        tmp = self._temp_path(key)
+        try:
+            with open(tmp, 'wb') as f:
+                shutil.copyfileobj(stream, f, CHUNK_SIZE)
+                size = f.tell()
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        return size
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self._path(key), 'rb')
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def size(self, key: str) -> int:
+        return self._path(key).stat().st_size
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+    @contextmanager
+    def fetch(self, key: str, directory: Optional[Path] = None) -> Iterator[Path]:
+        yield self._path(key)
+
+    def publish(self, key: str, path: Path) -> None:
+        if path != self._path(key):
+            atomic_replace(path, self._path(key))
+
+    @contextmanager
+    def staging(self, key: str, directory: Optional[Path] = None) -> Iterator[Path]:
+        # Written under a temporary name and renamed, so readers never see partial files
+        path = self._temp_path(key)
+        try:
+            yield path
+        except BaseException:
+            path.unlink(missing_ok=True)
+            raise
+        if path.exists():
+            os.replace(path, self._path(key))
+
+    def local_path(self, key: str) -> Optional[Path]:
+        return self._path(key)
+
+    def free_bytes(self) -> Optional[int]:
+        return shutil.disk_usage(self.directory).free
+
+
+@lru_cache
+def _s3_client():
+    """Shared S3 client; boto3 clients are thread-safe and pool connections."""
+    if boto3 is None:
+        raise RuntimeError("The boto3 package is required for the s3 storage backend")
+    return boto3.client(
+        's3',
+        endpoint_url=settings.S3_ENDPOINT_URL,
+        region_name=settings.S3_REGION,
+        aws_access_key_id=settings.S3_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+        config=BotoConfig(
+            max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+            s3={'addressing_style': 'path'} if settings.S3_ENDPOINT_URL else None,
+        ),
+    )
+
+
+class S3Storage(Storage):
+    """Stores files in an S3-compatible bucket (AWS S3, MinIO, ...)."""
+
+    def __init__(self, bucket: str, prefix: str = "", client=None):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = client or _s3_client()
+        self.transfer_config = TransferConfig(
+            multipart_threshold=settings.S3_MULTIPART_CHUNK_SIZE,
+            multipart_chunksize=settings.S3_MULTIPART_CHUNK_SIZE,
+            max_concurrency=settings.S3_TRANSFER_CONCURRENCY,
+        )
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{Path(key).name}"
+
+    def save(self, key: str, stream: BinaryIO) -> int:
+        # upload_fileobj streams the data as a multipart upload above the threshold
+        self.client.upload_fileobj(stream, self.bucket, self._key(key), Config=self.transfer_config)
+        return self.size(key)
+
+    def open(self, key: str) -> BinaryIO:
+        return self.client.get_object(Bucket=self.bucket, Key=self._key(key))['Body']
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def size(self, key: str) -> int:
+        return self.client.head_object(Bucket=self.bucket, Key=self._key(key))['ContentLength']
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    @contextmanager
+    def fetch(self, key: str, directory: Optional[Path] = None) -> Iterator[Path]:
+        with tempfile.TemporaryDirectory(dir=directory or settings.TEMP_DIR, prefix=owner_prefix()) as tmp:
+            path = Path(tmp) / Path(key).name
+            self.client.download_file(self.bucket, self._key(key), str(path), Config=self.transfer_config)
+            yield path
+
+    def publish(self, key: str, path: Path) -> None:
+        self.client.upload_file(str(path), self.bucket, self._key(key), Config=self.transfer_config)
+
+    @contextmanager
+    def staging(self, key: str, directory: Optional[Path] = None) -> Iterator[Path]:
+        with tempfile.TemporaryDirectory(dir=directory or settings.TEMP_DIR, prefix=owner_prefix()) as tmp:
+            path = Path(tmp) / Path(key).name
+            yield path
+            if path.exists():
+                self.publish(key, path)
+
+    def download_url(self, key: str, filename: Optional[str] = None) -> Optional[str]:
+        params = {'Bucket': self.bucket, 'Key': self._key(key)}
+        if filename:
+            params['ResponseContentDisposition'] = f'attachment; filename="{filename}"'
+        return self.client.generate_presigned_url(
+            'get_object', Params=params, ExpiresIn=settings.S3_PRESIGNED_URL_EXPIRY
+        )
+
+
+def _create_storage(directory: Path, prefix: str) -> Storage:
+    if settings.STORAGE_BACKEND == "local":
+        return LocalStorage(directory)
+    if settings.STORAGE_BACKEND == "s3":
+        return S3Storage(settings.S3_BUCKET, prefix)
+    raise ValueError(f"Unknown storage backend: {settings.STORAGE_BACKEND}")
+
+
+@lru_cache
+def get_upload_storage() -> Storage:
+    """Storage for uploaded originals awaiting compression."""
+    return _create_storage(settings.UPLOAD_DIR, "uploads/")
+
+
+@lru_cache
+def get_output_storage() -> Storage:
+    """Storage for compressed results."""
+    return _create_storage(settings.COMPRESSED_DIR, "compressed/")
@@ -0,0 +1,515 @@
+"""Load-testing harness for the compression API.
+
+Starts the API locally (or targets a running one with --url) and replays a
+weighted mix of files and strategies against POST /api/compress/ followed by
+GET of the download URL, at a fixed open-loop arrival rate. Reports
+throughput, latency percentiles and error rates per scenario, samples server
+CPU and RSS (including FFmpeg children) and saves everything as JSON so runs
+can be compared.
+
+Prerequisites:
+    pip install httpx psutil
+
+Usage:
+    python loadtest.py --rate 4 --duration 60
+    python loadtest.py --mix mix.json --set SCHEDULER_SMALL_JOB_COST=5 --compare loadtest_results/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import mimetypes
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import httpx
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+BACKEND_DIR = Path(__file__).resolve().parent
+
+# Weighted request mix; "file" describes a generated fixture, or use {"path": ...}
+DEFAULT_MIX = [
+    {"name": "jpeg-quality", "weight": 5,
+     "file": {"type": "image", "format": "jpg", "width": 1920, "height": 1080},
+     "compression": {"strategy": "quality", "quality": 75}},
+    {"name": "png-target", "weight": 2,
+     "file": {"type": "image", "format": "png", "width": 1280, "height": 720},
+     "compression": {"strategy": "target_size", "target_size_mb": 0.3}},
+    {"name": "wav-quality", "weight": 2,
+     "file": {"type": "audio", "format": "wav", "seconds": 30},
+     "compression": {"strategy": "quality", "quality": 60}},
+    {"name": "mp4-percentage", "weight": 1,
+     "file": {"type": "video", "format": "mp4", "seconds": 10, "width": 1280, "height": 720},
+     "compression": {"strategy": "percentage", "reduction_percentage": 50}},
+    {"name": "pdf-quality", "weight": 1,
+     "file": {"type": "document", "format": "pdf", "pages": 20},
+     "compression": {"strategy": "quality", "quality": 75}},
+]
+
+# The spawned server should measure capacity, not the per-client rate limiter
+# X-Client-ID is only honoured from trusted proxies; the harness connects over loopback
+DEFAULT_SERVER_ENV = {
+    "RATE_LIMIT_PER_MINUTE": "1000000",
+    "RATE_LIMIT_BURST": "1000000",
+    "TRUSTED_PROXIES": '["127.0.0.1"]',
+}
+
+
+@dataclass
+class Scenario:
+    """One entry of the request mix with its fixture loaded into memory."""
+    name: str
+    weight: float
+    filename: str
+    content: bytes
+    mime_type: str
+    compression: Dict[str, Any]
+
+
+@dataclass
+class RequestResult:
+    """Outcome and timings of one compress + download round trip."""
+    scenario: str
+    client_id: str
+    started: float
+    status: Optional[int] = None
+    error: Optional[str] = None
+    compress_ms: Optional[float] = None
+    download_ms: Optional[float] = None
+    total_ms: Optional[float] = None
+    bytes_sent: int = 0
+    bytes_received: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class ResourceSample:
+    """Server CPU and memory at one point in time."""
+    t: float
+    cpu_percent: float
+    rss_bytes: int
+    processes: int
+
+
+def generate_fixture(spec: Dict[str, Any], path: Path) -> None:
+    """Create a synthetic input file described by a mix entry."""
+    file_type = spec["type"]
+    if file_type == "image":
+        from PIL import Image
+        size = (spec.get("width", 1920), spec.get("height", 1080))
+        # Gradients plus noise compress like a photo, unlike a flat colour
+        img = Image.merge("RGB", (
+            Image.linear_gradient("L").resize(size),
+            Image.effect_noise(size, 48),
+            Image.radial_gradient("L").resize(size),
+        ))
+        if spec["format"] in ("jpg", "jpeg", "webp"):
+            img.save(path, quality=95)
+        else:
+            img.save(path)
+    elif file_type in ("audio", "video"):
+        import ffmpeg
+        seconds = spec.get("seconds", 10)
+        if file_type == "audio":
+            source = ffmpeg.input(f"sine=frequency=440:duration={seconds}", f="lavfi")
+            output = source.output(str(path))
+        else:
+            size = f"{spec.get('width', 1280)}x{spec.get('height', 720)}"
+            video = ffmpeg.input(f"testsrc2=size={size}:rate=30:duration={seconds}", f="lavfi")
+            audio = ffmpeg.input(f"sine=frequency=440:duration={seconds}", f="lavfi")
+            output = ffmpeg.output(video, audio, str(path), pix_fmt="yuv420p")
+        output.overwrite_output().run(capture_stdout=True, capture_stderr=True)
+    elif file_type == "document":
+        from PyPDF2 import PdfWriter
+        writer = PdfWriter()
+        for _ in range(spec.get("pages", 10)):
+            writer.add_blank_page(width=612, height=792)
+        with open(path, "wb") as f:
+            writer.write(f)
+    else:
+        raise ValueError(f"Unknown fixture type: {file_type}")
+
+
+def load_scenarios(mix: List[Dict[str, Any]], fixtures_dir: Path) -> List[Scenario]:
+    """Resolve or generate every fixture and read it into memory."""
+    fixtures_dir.mkdir(parents=True, exist_ok=True)
+    scenarios = []
+    for entry in mix:
+        spec = entry["file"]
+        if "path" in spec:
+            path = Path(spec["path"])
+        else:
+            # Fixture names encode the spec, so changed specs regenerate
+            key = "_".join(f"{k}-{v}" for k, v in sorted(spec.items()) if k != "format")
+            path = fixtures_dir / f"{key}.{spec['format']}"
+            if not path.exists():
+                print(f"Generating fixture {path.name}")
+                generate_fixture(spec, path)
+        scenarios.append(Scenario(
+            name=entry["name"],
+            weight=entry.get("weight", 1),
+            filename=path.name,
+            content=path.read_bytes(),
+            mime_type=mimetypes.guess_type(path.name)[0] or "application/octet-stream",
+            compression=entry["compression"],
+        ))
+    return scenarios
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int, workers: int, env_overrides: Dict[str, str], run_dir: Path) -> subprocess.Popen:
+    """Launch uvicorn in its own working directory so uploads and results stay isolated."""
+    env = {**os.environ, **DEFAULT_SERVER_ENV, **env_overrides}
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(BACKEND_DIR), env.get("PYTHONPATH")]))
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=run_dir,
+        env=env,
+    )
+
+
+async def wait_until_ready(base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                if (await client.get(f"{base_url}/health")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Server at {base_url} did not become ready")
+            await asyncio.sleep(0.2)
+
+
+def _cpu_seconds(process) -> float:
+    # children_* holds reaped descendants such as finished FFmpeg runs, which
+    # have left the process tree; live descendants are counted on their own
+    times = process.cpu_times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+async def sample_resources(pid: int, interval: float, samples: List[ResourceSample],
+                           started: float, stop: asyncio.Event) -> None:
+    """Record CPU and RSS of the server process tree until stopped."""
+    root = psutil.Process(pid)
+    previous_cpu: Optional[float] = None
+    previous_time = time.perf_counter()
+    while not stop.is_set():
+        cpu = 0.0
+        rss = 0
+        processes = 0
+        try:
+            tree = [root] + root.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return
+        for process in tree:
+            try:
+                with process.oneshot():
+                    rss += process.memory_info().rss
+                    cpu += _cpu_seconds(process)
+                processes += 1
+            except psutil.NoSuchProcess:
+                continue
+        now = time.perf_counter()
+        if previous_cpu is not None:
+            samples.append(ResourceSample(
+                t=round(now - started, 3),
+                cpu_percent=round(max(0.0, cpu - previous_cpu) / (now - previous_time) * 100, 1),
+                rss_bytes=rss,
+                processes=processes,
+            ))
+        previous_cpu, previous_time = cpu, now
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_request(client: httpx.AsyncClient, base_url: str, scenario: Scenario,
+                      client_id: str, started: float) -> RequestResult:
+    """Compress one file and download the result."""
+    result = RequestResult(scenario=scenario.name, client_id=client_id, started=round(time.perf_counter() - started, 3))
+    begin = time.perf_counter()
+    try:
+        response = await client.post(
+            f"{base_url}/api/compress/",
+            files={"file": (scenario.filename, scenario.content, scenario.mime_type)},
+            data={"compression_data": json.dumps(scenario.compression)},
+            headers={"X-Client-ID": client_id},
+        )
+        result.bytes_sent = len(scenario.content)
+        result.compress_ms = (time.perf_counter() - begin) * 1000
+        result.status = response.status_code
+        if response.status_code != 200:
+            result.error = f"http_{response.status_code}"
+            return result
+
+        download_url = response.json()["download_url"]
+        if download_url.startswith("/"):
+            download_url = base_url + download_url
+        download_begin = time.perf_counter()
+        async with client.stream("GET", download_url) as download:
+            async for chunk in download.aiter_bytes():
+                result.bytes_received += len(chunk)
+            result.status = download.status_code
+            if download.status_code != 200:
+                result.error = f"download_http_{download.status_code}"
+        result.download_ms = (time.perf_counter() - download_begin) * 1000
+    except httpx.TimeoutException:
+        result.error = "timeout"
+    except httpx.TransportError as e:
+        result.error = f"connection_{type(e).__name__}"
+    except Exception as e:
+        # A malformed response must not abort the whole run
+        result.error = f"client_{type(e).__name__}"
+    finally:
+        result.total_ms = (time.perf_counter() - begin) * 1000
+    return result
+
+
+async def generate_load(base_url: str, scenarios: List[Scenario], args: argparse.Namespace,
+                        started: float) -> List[RequestResult]:
+    """Fire requests on an open-loop schedule so slow responses do not lower the offered load."""
+    rng = random.Random(args.seed)
+    weights = [scenario.weight for scenario in scenarios]
+    client_ids = [f"loadtest-{i}" for i in range(args.clients)]
+    results: List[RequestResult] = []
+    in_flight = set()
+
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits, follow_redirects=True) as client:
+        next_arrival = 0.0
+        index = 0
+        while True:
+            next_arrival += rng.expovariate(args.rate) if args.arrival == "poisson" else 1 / args.rate
+            if next_arrival >= args.duration:
+                break
+            await asyncio.sleep(max(0.0, started + next_arrival - time.perf_counter()))
+            scenario = rng.choices(scenarios, weights)[0]
+            client_id = client_ids[index % len(client_ids)]
+            index += 1
+            if len(in_flight) >= args.max_in_flight:
+                # Record the shed request instead of silently lowering the rate
+                results.append(RequestResult(scenario.name, client_id, round(next_arrival, 3), error="client_overloaded"))
+                continue
+            task = asyncio.create_task(run_request(client, base_url, scenario, client_id, started))
+            task.add_done_callback(lambda t: results.append(t.result()))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        if in_flight:
+            await asyncio.gather(*in_flight)
+    return results
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Linear-interpolated percentile, p in [0, 100]."""
+    if not values:
+        return None
+    values = sorted(values)
+    rank = (len(values) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return round(values[low] + (values[high] - values[low]) * (rank - low), 2)
+
+
+def _latency(values: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "mean": round(sum(values) / len(values), 2) if values else None,
+        "max": round(max(values), 2) if values else None,
+    }
+
+
+def summarize(results: List[RequestResult], elapsed: float) -> Dict[str, Any]:
+    """Throughput, error breakdown and latency percentiles for a set of requests."""
+    succeeded = [r for r in results if r.ok]
+    errors: Dict[str, int] = {}
+    for r in results:
+        if not r.ok:
+            errors[r.error] = errors.get(r.error, 0) + 1
+    return {
+        "requests": len(results),
+        "succeeded": len(succeeded),
+        "errors": errors,
+        "error_rate": round(1 - len(succeeded) / len(results), 4) if results else 0.0,
+        "throughput_rps": round(len(succeeded) / elapsed, 3) if elapsed else 0.0,
+        "latency_ms": _latency([r.total_ms for r in succeeded]),
+        "compress_ms": _latency([r.compress_ms for r in succeeded]),
+        "download_ms": _latency([r.download_ms for r in succeeded]),
+        "bytes_sent": sum(r.bytes_sent for r in results),
+        "bytes_received": sum(r.bytes_received for r in results),
+    }
+
+
+def summarize_resources(samples: List[ResourceSample]) -> Optional[Dict[str, Any]]:
+    if not samples:
+        return None
+    cpu = [s.cpu_percent for s in samples]
+    return {
+        "cpu_percent_mean": round(sum(cpu) / len(cpu), 1),
+        "cpu_percent_p95": percentile(cpu, 95),
+        "cpu_percent_max": max(cpu),
+        "rss_bytes_max": max(s.rss_bytes for s in samples),
+        "rss_bytes_final": samples[-1].rss_bytes,
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    header = f"{'scenario':<18}{'reqs':>6}{'ok':>6}{'err%':>7}{'rps':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print()
+    print(header)
+    print("-" * len(header))
+    rows = list(report["scenarios"].items()) + [("TOTAL", report["summary"])]
+    for name, s in rows:
+        latency = s["latency_ms"]
+        print(f"{name:<18}{s['requests']:>6}{s['succeeded']:>6}{s['error_rate'] * 100:>7.1f}"
+              f"{s['throughput_rps']:>8.2f}{latency['p50'] or 0:>10.0f}{latency['p95'] or 0:>10.0f}{latency['p99'] or 0:>10.0f}")
+    if report["summary"]["errors"]:
+        print("errors: " + ", ".join(f"{k}={v}" for k, v in sorted(report["summary"]["errors"].items())))
+    resources = report.get("resources")
+    if resources:
+        print(f"server cpu mean {resources['cpu_percent_mean']}% / max {resources['cpu_percent_max']}%, "
+              f"rss max {resources['rss_bytes_max'] / (1024 * 1024):.0f}MB")
+
+
+def print_comparison(report: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    """Show throughput and latency changes against an earlier run."""
+    def change(new, old):
+        if new is None or not old:
+            return "n/a"
+        return f"{old:.0f} -> {new:.0f} ({(new - old) / old * 100:+.1f}%)"
+
+    print(f"\nCompared with {baseline.get('label') or baseline.get('started_at')}:")
+    rows = [(name, s, baseline["scenarios"].get(name)) for name, s in report["scenarios"].items()]
+    rows.append(("TOTAL", report["summary"], baseline["summary"]))
+    for name, new, old in rows:
+        if old is None:
+            continue
+        print(f"  {name:<18} rps {old['throughput_rps']:.2f} -> {new['throughput_rps']:.2f}  "
+              f"p95 {change(new['latency_ms']['p95'], old['latency_ms']['p95'])}  "
+              f"p99 {change(new['latency_ms']['p99'], old['latency_ms']['p99'])}  "
+              f"err {old['error_rate'] * 100:.1f}% -> {new['error_rate'] * 100:.1f}%")
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    mix = json.loads(Path(args.mix).read_text()) if args.mix else DEFAULT_MIX
+    scenarios = load_scenarios(mix, Path(args.fixtures_dir))
+    env_overrides = dict(item.split("=", 1) for item in args.set)
+
+    server = None
+    run_dir = None
+    base_url = args.url.rstrip("/") if args.url else None
+    server_pid = args.server_pid
+    if base_url is None:
+        run_dir = Path(tempfile.mkdtemp(prefix="loadtest-server-"))
+        port = args.port or _free_port()
+        server = start_server(port, args.workers, env_overrides, run_dir)
+        server_pid = server.pid
+        base_url = f"http://127.0.0.1:{port}"
+
+    samples: List[ResourceSample] = []
+    stop_sampling = asyncio.Event()
+    try:
+        await wait_until_ready(base_url)
+        started = time.perf_counter()
+        sampler = None
+        if server_pid and psutil is not None:
+            sampler = asyncio.create_task(
+                sample_resources(server_pid, args.sample_interval, samples, started, stop_sampling)
+            )
+        elif server_pid:
+            print("psutil is not installed; skipping server CPU/RSS sampling")
+
+        print(f"Offering {args.rate} req/s for {args.duration}s against {base_url}")
+        results = await generate_load(base_url, scenarios, args, started)
+        elapsed = time.perf_counter() - started
+        stop_sampling.set()
+        if sampler is not None:
+            await sampler
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+    config = {k: v for k, v in vars(args).items() if k not in ("compare", "output")}
+    return {
+        "label": args.label,
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "config": {**config, "server_env": {**DEFAULT_SERVER_ENV, **env_overrides} if server else None},
+        "mix": mix,
+        "elapsed_seconds": round(elapsed, 3),
+        "summary": summarize(results, elapsed),
+        "scenarios": {
+            scenario.name: summarize([r for r in results if r.scenario == scenario.name], elapsed)
+            for scenario in scenarios
+        },
+        "resources": summarize_resources(samples),
+        "resource_samples": [asdict(s) for s in samples],
+        "requests": [asdict(r) for r in sorted(results, key=lambda r: r.started)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the compression API")
+    parser.add_argument("--url", help="Target a running server instead of starting one, e.g. http://localhost:8000")
+    parser.add_argument("--server-pid", type=int, help="PID to sample CPU/RSS from when using --url")
+    parser.add_argument("--port", type=int, default=0, help="Port for the spawned server (default: a free port)")
+    parser.add_argument("--workers", type=int, default=1, help="Uvicorn worker processes for the spawned server")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="Setting passed to the spawned server as an environment variable (repeatable)")
+    parser.add_argument("--mix", help="JSON file with the request mix (default: built-in mix)")
+    parser.add_argument("--rate", type=float, default=2.0, help="Arrival rate in requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to generate load for")
+    parser.add_argument("--arrival", choices=("poisson", "constant"), default="poisson")
+    parser.add_argument("--clients", type=int, default=8, help="Distinct X-Client-ID values to spread requests over")
+    parser.add_argument("--max-in-flight", type=int, default=64, help="Requests beyond this are shed and counted as errors")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-request timeout in seconds")
+    parser.add_argument("--sample-interval", type=float, default=0.5, help="Seconds between CPU/RSS samples")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for arrivals and scenario choice")
+    parser.add_argument("--fixtures-dir", default="loadtest_results/fixtures")
+    parser.add_argument("--output", help="Result file (default: loadtest_results/<timestamp>.json)")
+    parser.add_argument("--label", help="Name for this run, shown in comparisons")
+    parser.add_argument("--compare", help="Earlier result file to compare against")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+
+    output = Path(args.output or f"loadtest_results/{datetime.now():%Y%m%d-%H%M%S}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nResults saved to {output}")
+
+    if args.compare:
+        print_comparison(report, json.loads(Path(args.compare).read_text()))
+
+
+if __name__ == "__main__":
+    main()
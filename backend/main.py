@@ -1,14 +1,25 @@
 """Main application entry point."""
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
 from app.routes.compression import router as compression_router
+from app.utils.scratch import scratch
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Remove scratch files left behind by processes that crashed mid-job
+    scratch.sweep([settings.UPLOAD_DIR, settings.COMPRESSED_DIR])
+    yield
+
 
 # Create FastAPI application
 app = FastAPI(
     title=settings.API_TITLE,
     version=settings.API_VERSION,
-    description="A comprehensive file compression API supporting images, videos, audio, and documents"
+    description="A comprehensive file compression API supporting images, videos, audio, and documents",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -0,0 +1,19 @@
+"""Shared test setup."""
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+# Import the app the way main.py and worker.py do, from the backend directory
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# Keep uploads, results and the job database out of the source tree
+_data_dir = Path(tempfile.mkdtemp(prefix="file-compressor-tests-"))
+for name in ("UPLOAD_DIR", "TEMP_DIR", "COMPRESSED_DIR"):
+    os.environ.setdefault(name, str(_data_dir / name.lower()))
+os.environ.setdefault("QUEUE_SQLITE_PATH", str(_data_dir / "jobs.db"))
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_data_dir, ignore_errors=True)
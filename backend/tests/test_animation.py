@@ -0,0 +1,88 @@
+"""Tests for frame-aware compression of animated images."""
+import io
+import pytest
+from PIL import Image
+from app.models import CompressionRequest, CompressionStrategy
+from app.services.animation import AnimatedImageCompressor, Frame, decimate, load_frames, reduce_frame_rate
+
+RED, GREEN, BLUE = (255, 0, 0, 255), (0, 255, 0, 255), (0, 0, 255, 255)
+
+
+def solid(color) -> Image.Image:
+    return Image.new('RGBA', (8, 8), color)
+
+
+def make_gif(colors, durations, **params) -> Image.Image:
+    images = [solid(color).convert('RGB') for color in colors]
+    buffer = io.BytesIO()
+    images[0].save(buffer, format='GIF', save_all=True, append_images=images[1:], duration=durations, **params)
+    buffer.seek(0)
+    return Image.open(buffer)
+
+
+def colors_of(frames):
+    return [(frame.image.getpixel((0, 0)), frame.duration) for frame in frames]
+
+
+def compress(img: Image.Image, tmp_path) -> Image.Image:
+    request = CompressionRequest(strategy=CompressionStrategy.QUALITY, quality=80)
+    path = AnimatedImageCompressor(img, tmp_path / "out.gif", 1024, tmp_path).compress(request)
+    return Image.open(path)
+
+
+def test_load_frames_merges_duplicates():
+    frames = load_frames(make_gif([RED, RED, GREEN], [100, 50, 200]))
+    assert colors_of(frames) == [(RED, 150), (GREEN, 200)]
+
+
+def test_load_frames_caps_decoded_pixels():
+    img = make_gif([RED, GREEN, BLUE], [100, 100, 100])
+    assert len(load_frames(img, max_pixels=3 * 64)) == 3
+    img.seek(0)
+    with pytest.raises(ValueError):
+        load_frames(img, max_pixels=2 * 64)
+
+
+def test_reduce_frame_rate_without_limits_keeps_short_frames():
+    frames = [Frame(solid(RED), 10), Frame(solid(GREEN), 10), Frame(solid(BLUE), 500)]
+    assert colors_of(reduce_frame_rate(frames)) == [(RED, 10), (GREEN, 10), (BLUE, 500)]
+
+
+def test_reduce_frame_rate_keeps_last_frame_of_each_group():
+    frames = [Frame(solid(RED), 100), Frame(solid(GREEN), 100), Frame(solid(BLUE), 100)]
+    assert colors_of(reduce_frame_rate(frames, max_fps=5)) == [(GREEN, 200), (BLUE, 100)]
+    short = [Frame(solid(RED), 10), Frame(solid(GREEN), 10), Frame(solid(BLUE), 500)]
+    assert colors_of(reduce_frame_rate(short, max_frames=10)) == [(GREEN, 20), (BLUE, 500)]
+
+
+def test_reduce_frame_rate_caps_frame_count():
+    frames = [Frame(solid(color), 100) for color in (RED, GREEN, BLUE, RED)]
+    assert colors_of(reduce_frame_rate(frames, max_frames=2)) == [(GREEN, 200), (RED, 200)]
+
+
+def test_decimate_keeps_last_frame_and_total_time():
+    frames = [Frame(solid(color), 100) for color in (RED, GREEN, BLUE)]
+    assert colors_of(decimate(frames, 2)) == [(GREEN, 200), (BLUE, 100)]
+    assert decimate(frames, 1) is frames
+
+
+def test_gif_without_loop_still_plays_once(tmp_path):
+    output = compress(make_gif([RED, GREEN], [100, 100]), tmp_path)
+    assert 'loop' not in output.info
+
+
+def test_gif_loop_count_is_kept(tmp_path):
+    output = compress(make_gif([RED, GREEN], [100, 100], loop=3), tmp_path)
+    assert output.info['loop'] == 3
+
+
+def test_transparent_gif_restores_background_between_frames(tmp_path):
+    frames = [Image.new('RGBA', (8, 8), (0, 0, 0, 0)), solid(RED)]
+    frames[0].paste(GREEN, (0, 0, 4, 4))
+    buffer = io.BytesIO()
+    frames[0].save(buffer, format='GIF', save_all=True, append_images=frames[1:], duration=100, loop=0, disposal=2)
+    buffer.seek(0)
+    output = compress(Image.open(buffer), tmp_path)
+    assert output.n_frames == 2
+    assert output.disposal_method == 2
+    assert output.info['loop'] == 0
@@ -0,0 +1,50 @@
+"""Tests for dry-run compression estimates."""
+import io
+import pytest
+from PIL import Image
+from app.models import EstimateRequest, FileType
+from app.services.estimator import SPILL_SECONDS_PER_MB, CompressionEstimator, _format_size
+from app.services.scheduler import JobClass, scheduler
+
+MB = 1024 * 1024
+
+
+def test_format_size():
+    assert _format_size(512) == "512B"
+    assert _format_size(1536) == "1.5KB"
+    assert _format_size(3 * MB) == "3.0MB"
+    assert _format_size(5 * 1024 * MB) == "5.0GB"
+
+
+def test_media_cost_includes_spill(tmp_path):
+    small = CompressionEstimator(b"\0" * MB, FileType.VIDEO)
+    large = CompressionEstimator(b"\0" * (100 * MB), FileType.VIDEO)
+    assert small.needs_spill and large.needs_spill
+    assert large.cost == pytest.approx(small.cost + 99 * SPILL_SECONDS_PER_MB)
+
+    # Files already on disk are read in place
+    path = tmp_path / "clip.mp4"
+    with open(path, "wb") as f:
+        f.truncate(100 * MB)
+    on_disk = CompressionEstimator(path, FileType.VIDEO)
+    assert not on_disk.needs_spill
+    assert on_disk.cost < small.cost
+
+
+def test_image_cost_grows_with_size():
+    small = CompressionEstimator(b"\0" * 100_000, FileType.IMAGE)
+    large = CompressionEstimator(b"\0" * (20 * MB), FileType.IMAGE)
+    assert scheduler.classify(small.cost) == JobClass.SMALL
+    assert scheduler.classify(large.cost) != JobClass.SMALL
+
+
+def test_unreachable_image_target_has_one_warning():
+    buffer = io.BytesIO()
+    Image.effect_noise((1200, 900), 64).convert("RGB").save(buffer, "PNG")
+    estimator = CompressionEstimator(buffer.getvalue(), FileType.IMAGE)
+    result = estimator.estimate(EstimateRequest(target_size_mb=0.0005))
+    target = next(e for e in result["estimates"] if e["strategy"] == "target_size")
+    assert not target["feasible"]
+    assert len(target["warnings"]) == 1
+    assert "0.00MB" not in target["warnings"][0]
+    assert "524B target" in target["warnings"][0]
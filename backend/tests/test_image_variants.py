@@ -0,0 +1,55 @@
+"""Tests for multi-variant image generation."""
+import io
+import threading
+import pytest
+from PIL import Image
+from app.models import DEFAULT_IMAGE_VARIANTS, ImageFormat, ImageVariant
+from app.services import image_variants
+from app.services.image_variants import ImageVariantGenerator
+from app.utils.storage import LocalStorage
+
+
+@pytest.fixture
+def photo() -> bytes:
+    buffer = io.BytesIO()
+    Image.effect_noise((800, 600), 64).convert("RGB").save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def outputs(tmp_path, monkeypatch):
+    storage = LocalStorage(tmp_path / "compressed")
+    monkeypatch.setattr(image_variants, "get_output_storage", lambda: storage)
+    return storage
+
+
+def test_cost_grows_with_variants(photo):
+    generator = ImageVariantGenerator(photo, "photo.jpg")
+    one = generator.estimate_cost([ImageVariant(name="full")])
+    six = generator.estimate_cost(DEFAULT_IMAGE_VARIANTS)
+    thumbnail = generator.estimate_cost([ImageVariant(name="thumb", max_width=80)])
+    assert six > one > thumbnail
+
+
+def test_generate_variants(photo, outputs, monkeypatch):
+    threads = set()
+    encode = ImageVariantGenerator._encode
+
+    def tracking_encode(self, img, variant):
+        threads.add(threading.current_thread().name)
+        return encode(self, img, variant)
+
+    monkeypatch.setattr(ImageVariantGenerator, "_encode", tracking_encode)
+    variants = [
+        ImageVariant(name="full", format=ImageFormat.WEBP),
+        ImageVariant(name="medium", max_width=400, format=ImageFormat.JPEG),
+        ImageVariant(name="thumb", max_width=100, max_height=100, format=ImageFormat.PNG),
+    ]
+    size, results = ImageVariantGenerator(photo, "photo.jpg").generate(variants, 2)
+
+    assert size == (800, 600)
+    assert [r["name"] for r in results] == ["full", "medium", "thumb"]
+    assert [(r["width"], r["height"]) for r in results] == [(800, 600), (400, 300), (100, 75)]
+    for result in results:
+        assert outputs.size(result["filename"]) == result["size"]
+    assert len(threads) <= 2
@@ -0,0 +1,162 @@
+"""Tests for the SQLite and Redis job queue backends."""
+import fakeredis
+import pytest
+from app.models import JobStatus
+from app.services.job_queue import Job, RedisJobQueue, SQLiteJobQueue
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def queue(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteJobQueue(tmp_path / "jobs.db")
+    return RedisJobQueue(client=fakeredis.FakeRedis(decode_responses=True))
+
+
+def make_job(name: str = "a.jpg", max_attempts: int = 3) -> Job:
+    return Job(
+        file_type="image",
+        input_key=name,
+        output_key=f"compressed_{name}",
+        request={"strategy": "quality", "quality": 75},
+        max_attempts=max_attempts,
+    )
+
+
+def test_claim_complete(queue):
+    job = queue.enqueue(make_job())
+    assert queue.pending_count() == 1
+
+    claimed = queue.claim("w1", 60)
+    assert claimed.job_id == job.job_id
+    assert claimed.status == JobStatus.RUNNING
+    assert claimed.worker_id == "w1"
+    assert claimed.attempts == 1
+    assert queue.pending_count() == 0
+    assert queue.claim("w2", 60) is None
+
+    queue.complete(job.job_id, "w1", {"filename": "compressed_a.jpg"})
+    stored = queue.get(job.job_id)
+    assert stored.status == JobStatus.COMPLETED
+    assert stored.result == {"filename": "compressed_a.jpg"}
+
+
+def test_claims_oldest_first(queue):
+    first = queue.enqueue(make_job("1.jpg"))
+    second = queue.enqueue(make_job("2.jpg"))
+    assert queue.claim("w1", 60).job_id == first.job_id
+    assert queue.claim("w1", 60).job_id == second.job_id
+
+
+def test_get_unknown_job(queue):
+    assert queue.get("missing") is None
+
+
+def test_heartbeat_extends_lease(queue):
+    job = queue.enqueue(make_job())
+    claimed = queue.claim("w1", 60)
+    assert queue.heartbeat(job.job_id, "w1", 600)
+    assert queue.get(job.job_id).lease_expires > claimed.lease_expires
+    assert not queue.heartbeat(job.job_id, "w2", 600)
+
+
+def test_expired_lease_is_requeued(queue):
+    job = queue.enqueue(make_job())
+    queue.claim("w1", -1)
+
+    released = queue.requeue_expired()
+    assert [j.job_id for j in released] == [job.job_id]
+    assert released[0].status == JobStatus.PENDING
+    assert queue.get(job.job_id).error == "Lease expired"
+    # The worker that lost the lease can no longer extend or fail it
+    assert not queue.heartbeat(job.job_id, "w1", 60)
+    assert queue.fail(job.job_id, "w1", "boom") is None
+
+    reclaimed = queue.claim("w2", 60)
+    assert reclaimed.job_id == job.job_id
+    assert reclaimed.attempts == 2
+    assert queue.requeue_expired() == []
+
+
+def test_fail_retries_until_max_attempts(queue):
+    job = queue.enqueue(make_job(max_attempts=2))
+
+    queue.claim("w1", 60)
+    assert queue.fail(job.job_id, "w1", "first").status == JobStatus.PENDING
+    assert queue.pending_count() == 1
+
+    queue.claim("w1", 60)
+    failed = queue.fail(job.job_id, "w1", "second")
+    assert failed.status == JobStatus.FAILED
+    assert queue.get(job.job_id).error == "second"
+    assert queue.pending_count() == 0
+    assert queue.claim("w1", 60) is None
+
+
+def test_expired_last_attempt_fails(queue):
+    job = queue.enqueue(make_job(max_attempts=1))
+    queue.claim("w1", -1)
+    released = queue.requeue_expired()
+    assert released[0].status == JobStatus.FAILED
+    assert queue.get(job.job_id).status == JobStatus.FAILED
+    assert queue.claim("w2", 60) is None
+
+
+def test_complete_is_idempotent(queue):
+    job = queue.enqueue(make_job())
+    queue.claim("w1", 60)
+    assert queue.complete(job.job_id, "w1", {"filename": "first"})
+    assert not queue.complete(job.job_id, "w1", {"filename": "second"})
+    assert queue.get(job.job_id).result == {"filename": "first"}
+
+
+def test_stale_worker_cannot_complete(queue):
+    job = queue.enqueue(make_job())
+    queue.claim("w1", -1)
+    queue.requeue_expired()
+    queue.claim("w2", 60)
+    assert not queue.complete(job.job_id, "w1", {"filename": "stale"})
+    assert queue.get(job.job_id).status == JobStatus.RUNNING
+    assert queue.complete(job.job_id, "w2", {"filename": "fresh"})
+    assert queue.get(job.job_id).result == {"filename": "fresh"}
+
+
+def test_redis_claim_moves_id_and_takes_lease_together():
+    client = fakeredis.FakeRedis(decode_responses=True)
+    queue = RedisJobQueue(client=client)
+    job = queue.enqueue(make_job())
+    claimed = queue.claim("w1", 60)
+    assert client.lrange(queue.pending_key, 0, -1) == []
+    assert client.lrange(queue.processing_key, 0, -1) == [job.job_id]
+    assert client.zscore(queue.leases_key, job.job_id) == pytest.approx(claimed.lease_expires)
+
+
+def test_redis_claim_retries_when_job_changes_concurrently():
+    client = fakeredis.FakeRedis(decode_responses=True)
+    queue = RedisJobQueue(client=client)
+    job = queue.enqueue(make_job())
+    load = queue._load
+    calls = []
+
+    def racing_load(conn, job_id):
+        loaded = load(conn, job_id)
+        if not calls:
+            # Another client touches the job between the read and the write
+            calls.append(job_id)
+            client.set(queue.job_prefix + job_id, client.get(queue.job_prefix + job_id))
+        return loaded
+
+    queue._load = racing_load
+    claimed = queue.claim("w1", 60)
+    assert claimed.job_id == job.job_id
+    assert queue.get(job.job_id).attempts == 1
+    assert client.lrange(queue.processing_key, 0, -1) == [job.job_id]
+
+
+def test_redis_claim_skips_stale_entries():
+    client = fakeredis.FakeRedis(decode_responses=True)
+    queue = RedisJobQueue(client=client)
+    job = queue.enqueue(make_job())
+    # A duplicate id left behind by an earlier requeue
+    client.rpush(queue.pending_key, "gone")
+    assert queue.claim("w1", 60).job_id == job.job_id
+    assert client.lrange(queue.processing_key, 0, -1) == [job.job_id]
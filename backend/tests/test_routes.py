@@ -0,0 +1,302 @@
+"""Tests for request validation in the compression routes."""
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from app.config import settings
+from app.utils.scratch import scratch
+from main import app
+
+
+@pytest.fixture(scope="module")
+def client():
+    return TestClient(app)
+
+
+def test_jobs_rejects_invalid_compression_data(client):
+    files = {"file": ("a.jpg", b"\xff\xd8\xff\xe0", "image/jpeg")}
+    response = client.post("/api/compress/jobs", files=files, data={"compression_data": '{"strategy": "bogus"}'})
+    assert response.status_code == 422
+    response = client.post("/api/compress/jobs", files=files, data={"compression_data": "not json"})
+    assert response.status_code == 400
+
+
+def test_compress_rejects_invalid_compression_data(client):
+    files = {"file": ("a.jpg", b"\xff\xd8\xff\xe0", "image/jpeg")}
+    response = client.post("/api/compress/", files=files, data={"compression_data": '{"strategy": "bogus"}'})
+    assert response.status_code == 422
+    response = client.post("/api/compress/", files=files, data={"compression_data": "not json"})
+    assert response.status_code == 400
+
+
+def test_complete_upload_rejects_invalid_compression_data(client):
+    session = client.post("/api/compress/uploads", json={"filename": "a.jpg", "size": 10}).json()
+    response = client.post(
+        f"/api/compress/uploads/{session['upload_id']}/complete",
+        data={"compression_data": '{"strategy": "bogus"}'}
+    )
+    assert response.status_code == 422
+    client.delete(f"/api/compress/uploads/{session['upload_id']}")
+
+
+def test_chunk_error_after_session_expired(client, monkeypatch):
+    from app.routes import compression
+    from app.services.upload_sessions import UploadError
+
+    session = client.post("/api/compress/uploads", json={"filename": "a.jpg", "size": 10}).json()
+    upload_id = session["upload_id"]
+
+    def write_chunk(*args):
+        # The session disappears while the chunk is being rejected
+        compression.upload_sessions.discard(upload_id)
+        raise UploadError("Checksum mismatch")
+
+    monkeypatch.setattr(compression.upload_sessions, "write_chunk", write_chunk)
+    response = client.put(
+        f"/api/compress/uploads/{upload_id}", params={"offset": 0},
+        content=b"0123456789", headers={"X-Chunk-SHA256": "0" * 64}
+    )
+    assert response.status_code == 400
+    assert "upload-offset" not in response.headers
+
+
+
+QUALITY_50 = {"compression_data": '{"strategy": "quality", "quality": 50}'}
+
+
+@pytest.fixture
+def jpeg() -> bytes:
+    import io
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.effect_noise((64, 48), 64).convert("RGB").save(buffer, "JPEG", quality=95)
+    return buffer.getvalue()
+
+
+def put_chunk(client, upload_id, offset, data, checksum=None):
+    import hashlib
+
+    return client.put(
+        f"/api/compress/uploads/{upload_id}", params={"offset": offset}, content=data,
+        headers={"X-Chunk-SHA256": checksum or hashlib.sha256(data).hexdigest()}
+    )
+
+
+def start_upload(client, data):
+    session = client.post("/api/compress/uploads", json={"filename": "photo.jpg", "size": len(data)})
+    assert session.status_code == 201
+    return session.json()["upload_id"]
+
+
+def test_chunked_upload_then_complete(client, jpeg):
+    upload_id = start_upload(client, jpeg)
+    step = len(jpeg) // 3 + 1
+    for offset in range(0, len(jpeg), step):
+        response = put_chunk(client, upload_id, offset, jpeg[offset:offset + step])
+        assert response.status_code == 200
+        assert response.json()["offset"] == min(offset + step, len(jpeg))
+    assert client.get(f"/api/compress/uploads/{upload_id}").json()["complete"] is True
+
+    response = client.post(f"/api/compress/uploads/{upload_id}/complete", data=QUALITY_50)
+    assert response.status_code == 200
+    assert response.json()["original_size"] == len(jpeg)
+    assert client.get(f"/api/compress/uploads/{upload_id}").status_code == 404
+
+
+def test_upload_resumes_after_retried_chunk(client, jpeg):
+    upload_id = start_upload(client, jpeg)
+    half = len(jpeg) // 2
+    assert put_chunk(client, upload_id, 0, jpeg[:half]).status_code == 200
+    # The client lost the response and sends the same chunk again
+    response = put_chunk(client, upload_id, 0, jpeg[:half])
+    assert response.status_code == 200
+    assert response.json()["offset"] == half
+
+    # A chunk past the current offset is refused with the offset to resume from
+    response = put_chunk(client, upload_id, half + 10, jpeg[half + 10:])
+    assert response.status_code == 409
+    assert response.headers["Upload-Offset"] == str(half)
+    offset = client.get(f"/api/compress/uploads/{upload_id}").json()["offset"]
+    assert offset == half
+    assert put_chunk(client, upload_id, offset, jpeg[offset:]).json()["complete"] is True
+    response = client.post(f"/api/compress/uploads/{upload_id}/complete", data=QUALITY_50)
+    assert response.status_code == 200
+
+
+def test_chunk_checksum_mismatch(client, jpeg):
+    upload_id = start_upload(client, jpeg)
+    response = put_chunk(client, upload_id, 0, jpeg, checksum="0" * 64)
+    assert response.status_code == 400
+    assert response.headers["Upload-Offset"] == "0"
+    assert client.get(f"/api/compress/uploads/{upload_id}").json()["offset"] == 0
+    client.delete(f"/api/compress/uploads/{upload_id}")
+
+
+def test_upload_is_completed_once(client, jpeg, monkeypatch):
+    from app.routes import compression
+
+    upload_id = start_upload(client, jpeg)
+    put_chunk(client, upload_id, 0, jpeg)
+    # Another request is compressing the session
+    assert compression.upload_sessions.claim(upload_id)
+    assert not compression.upload_sessions.claim(upload_id)
+    response = client.post(f"/api/compress/uploads/{upload_id}/complete", data=QUALITY_50)
+    assert response.status_code == 409
+    assert client.delete(f"/api/compress/uploads/{upload_id}").status_code == 409
+    compression.upload_sessions.release(upload_id)
+
+    # A failed attempt gives up its claim so the client can retry
+    async def failing_submit(*args, **kwargs):
+        raise RuntimeError("encoder crashed")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(compression.scheduler, "submit", failing_submit)
+        response = client.post(f"/api/compress/uploads/{upload_id}/complete", data=QUALITY_50)
+    assert response.status_code == 500
+    response = client.post(f"/api/compress/uploads/{upload_id}/complete", data=QUALITY_50)
+    assert response.status_code == 200
+    assert not compression.upload_sessions.is_claimed(upload_id)
+
+
+def test_stream_rejects_invalid_content_length(client):
+    response = client.post(
+        "/api/compress/stream", params={"filename": "a.mp3"},
+        content=b"data", headers={"Content-Length": "abc"}
+    )
+    assert response.status_code == 400
+
+
+def test_stream_slot_is_held_from_construction(client):
+    from app.services.ffmpeg_stream import FFmpegPipe
+
+    pipes = [FFmpegPipe({}, 1024) for _ in range(settings.MAX_CONCURRENT_STREAMS)]
+    response = client.post("/api/compress/stream", params={"filename": "a.mp3"}, content=b"data")
+    assert response.status_code == 503
+    for pipe in pipes:
+        asyncio.run(pipe.close())
+        asyncio.run(pipe.close())
+    assert FFmpegPipe.active == 0
+
+
+def test_stream_start_failure_releases_slot_and_spill(client, monkeypatch):
+    from app.services import ffmpeg_stream
+
+    async def missing_binary(*args, **kwargs):
+        raise FileNotFoundError("ffmpeg")
+
+    monkeypatch.setattr(ffmpeg_stream.asyncio, "create_subprocess_exec", missing_binary)
+    # 'mdat' before 'moov' makes the input seekable-only, so it is spilled first
+    body = (16).to_bytes(4, "big") + b"ftypisom" + b"\0" * 4 + (16).to_bytes(4, "big") + b"mdat" + b"\0" * 8
+    temp_dir = settings.TEMP_DIR
+    before = set(temp_dir.iterdir())
+    response = client.post("/api/compress/stream", params={"filename": "a.mp4"}, content=body)
+    assert response.status_code == 500
+    assert ffmpeg_stream.FFmpegPipe.active == 0
+    assert set(temp_dir.iterdir()) == before
+    assert all(root["reserved"] == 0 for root in scratch.state().values())
+
+
+def test_media_upload_is_probed_without_holding_scratch(client, monkeypatch):
+    from app.routes import compression
+
+    seen = {}
+
+    def get_stream_duration(stream, size):
+        seen["probed"] = (stream.tell(), size)
+        stream.read()
+        return 60.0
+
+    def submit(client_id, file_type, size, func, *args, duration=None, cost=None):
+        seen["duration"] = duration
+        seen["reserved"] = sum(root["reserved"] for root in scratch.state().values())
+        return args[2], 1
+
+    async def fake_submit(*args, **kwargs):
+        return submit(*args, **kwargs)
+
+    monkeypatch.setattr(compression.FileHandler, "get_stream_duration", get_stream_duration)
+    monkeypatch.setattr(compression.scheduler, "submit", fake_submit)
+    data = b"ID3" + b"\0" * 1024
+    files = {"file": ("a.mp3", data, "audio/mpeg")}
+    response = client.post(
+        "/api/compress/", files=files, data={"compression_data": '{"strategy": "quality", "quality": 50}'}
+    )
+    assert response.status_code == 200
+    assert seen["probed"] == (0, len(data))
+    assert seen["duration"] == 60.0
+    # Nothing is spilled or reserved while the job waits for the scheduler
+    assert seen["reserved"] == 0
+
+
+def test_stream_rejected_without_scratch_space(client, monkeypatch):
+    from app.services.ffmpeg_stream import FFmpegPipe
+
+    monkeypatch.setattr(scratch, "_fits_tmpfs", lambda needed: False)
+    monkeypatch.setattr(scratch, "_fits_disk", lambda directory, needed: False)
+    response = client.post("/api/compress/stream", params={"filename": "a.mp3"}, content=b"data")
+    assert response.status_code == 507
+    assert response.headers["Retry-After"] == "30"
+    assert FFmpegPipe.active == 0
+
+
+def test_output_spool_caps_overflow_file(tmp_path):
+    from app.services.ffmpeg_stream import _OutputSpool
+
+    async def fill():
+        spool = _OutputSpool(4, tmp_path, 4)
+        await spool.put(b"1234", block=False)
+        await spool.put(b"5678", block=False)
+        with pytest.raises(ValueError):
+            await spool.put(b"9", block=False)
+        assert await spool.get() == b"1234"
+        assert await spool.get() == b"5678"
+        spool.discard()
+
+    asyncio.run(fill())
+
+
+def test_stream_output_cap_uses_scratch_reservation(tmp_path, monkeypatch):
+    from app.services import ffmpeg_stream
+
+    async def missing_binary(*args, **kwargs):
+        raise FileNotFoundError("ffmpeg")
+
+    monkeypatch.setattr(ffmpeg_stream.asyncio, "create_subprocess_exec", missing_binary)
+
+    async def run():
+        # Output larger than the input fits, as long as the reservation covers it
+        pipe = ffmpeg_stream.FFmpegPipe({}, 1000)
+        assert pipe._spool.max_file_bytes == scratch.required_space(1000) > 1000
+        await pipe.close()
+
+        # A spilled input leaves the rest of the reservation for output
+        pipe = ffmpeg_stream.FFmpegPipe({}, 1000)
+        pipe.input_path = pipe.workspace / "input.mp4"
+        pipe.input_path.write_bytes(b"\0" * 1000)
+        with pytest.raises(FileNotFoundError):
+            await pipe.start()
+        assert pipe._spool.max_file_bytes == scratch.required_space(1000) - 1000
+        await pipe.close()
+
+    asyncio.run(run())
+
+
+def box(box_type: bytes, payload: bytes = b"") -> bytes:
+    return (8 + len(payload)).to_bytes(4, "big") + box_type + payload
+
+
+@pytest.mark.parametrize("suffix, head, expected", [
+    (".mp4", box(b"ftyp", b"isom\0\0\0\0") + box(b"moov") + box(b"mdat"), False),
+    (".MOV", box(b"ftyp", b"qt  \0\0\0\0") + box(b"free") + box(b"moov"), False),
+    (".mp4", box(b"ftyp", b"isom\0\0\0\0") + box(b"mdat") + box(b"moov"), True),
+    (".m4a", box(b"ftyp", b"M4A \0\0\0\0") + (1).to_bytes(4, "big") + b"mdat" + (24).to_bytes(8, "big"), True),
+    (".mp4", box(b"ftyp", b"isom\0\0\0\0") + (0).to_bytes(4, "big") + b"skip", True),
+    (".mp4", box(b"ftyp", b"isom\0\0\0\0")[:10], None),
+    (".mp4", (64).to_bytes(4, "big") + b"ftyp", None),
+    (".mkv", b"\x1a\x45\xdf\xa3", False),
+    (".mp3", b"", False),
+])
+def test_needs_seekable_input(suffix, head, expected):
+    from app.services.ffmpeg_stream import needs_seekable_input
+
+    assert needs_seekable_input(suffix, head) is expected
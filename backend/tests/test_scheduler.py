@@ -0,0 +1,203 @@
+"""Tests for cost-based scheduling and rate limiting."""
+import asyncio
+import threading
+import time
+import pytest
+from app.models import FileType
+from app.services.scheduler import CompressionScheduler, JobClass, OverloadedError, RateLimitedError
+
+
+def make_scheduler(**overrides) -> CompressionScheduler:
+    options = dict(
+        concurrency={"small": 1, "medium": 1, "large": 1},
+        max_queued={"small": 4, "medium": 4, "large": 4},
+        small_cost=2.0,
+        large_cost=30.0,
+        rate_per_minute=60,
+        burst=2,
+    )
+    options.update(overrides)
+    return CompressionScheduler(**options)
+
+
+def test_classify_by_cost():
+    scheduler = make_scheduler()
+    assert scheduler.classify(0.5) == JobClass.SMALL
+    assert scheduler.classify(2.0) == JobClass.SMALL
+    assert scheduler.classify(10.0) == JobClass.MEDIUM
+    assert scheduler.classify(30.0) == JobClass.LARGE
+
+
+def test_jobs_run_in_their_class():
+    scheduler = make_scheduler()
+
+    async def run():
+        for cost in (1.0, 10.0, 60.0):
+            assert await scheduler.submit("client", FileType.IMAGE, 0, lambda c=cost: c, cost=cost) == cost
+
+    asyncio.run(run())
+    state = scheduler.state()
+    assert [state[c.value]["completed"] for c in JobClass] == [1, 1, 1]
+
+
+def test_size_drives_cost():
+    scheduler = make_scheduler()
+    small = scheduler.estimate_cost(FileType.IMAGE, 1024)
+    large = scheduler.estimate_cost(FileType.IMAGE, 100 * 1024 * 1024)
+    assert scheduler.classify(small) == JobClass.SMALL
+    assert large > small
+
+
+def test_large_jobs_do_not_block_small_ones():
+    scheduler = make_scheduler()
+    release = threading.Event()
+
+    async def run():
+        large = asyncio.create_task(scheduler.submit("a", FileType.IMAGE, 0, release.wait, cost=60.0))
+        await asyncio.sleep(0.05)
+        small = await scheduler.submit("b", FileType.IMAGE, 0, lambda: "done", cost=1.0)
+        assert not large.done()
+        release.set()
+        await large
+        return small
+
+    assert asyncio.run(run()) == "done"
+
+
+def test_round_robin_between_clients():
+    scheduler = make_scheduler()
+    release = threading.Event()
+    order = []
+
+    async def run():
+        blocker = asyncio.create_task(scheduler.submit("a", FileType.IMAGE, 0, release.wait, cost=1.0))
+        await asyncio.sleep(0.05)
+        jobs = [
+            asyncio.create_task(scheduler.submit(client, FileType.IMAGE, 0, order.append, name, cost=1.0))
+            for client, name in (("a", "a1"), ("a", "a2"), ("a", "a3"), ("b", "b1"))
+        ]
+        await asyncio.sleep(0.05)
+        release.set()
+        await asyncio.gather(blocker, *jobs)
+
+    asyncio.run(run())
+    assert order == ["a1", "b1", "a2", "a3"]
+
+
+def test_full_queue_is_rejected():
+    scheduler = make_scheduler(max_queued={"small": 1, "medium": 1, "large": 1})
+    release = threading.Event()
+
+    async def run():
+        running = asyncio.create_task(scheduler.submit("a", FileType.IMAGE, 0, release.wait, cost=1.0))
+        await asyncio.sleep(0.05)
+        queued = asyncio.create_task(scheduler.submit("a", FileType.IMAGE, 0, lambda: None, cost=1.0))
+        await asyncio.sleep(0.05)
+        with pytest.raises(OverloadedError) as excinfo:
+            scheduler.check_capacity(FileType.IMAGE, 0)
+        assert excinfo.value.status_code == 503
+        assert excinfo.value.retry_after >= 1
+        with pytest.raises(OverloadedError):
+            await scheduler.submit("b", FileType.IMAGE, 0, lambda: None, cost=1.0)
+        release.set()
+        await asyncio.gather(running, queued)
+
+    asyncio.run(run())
+    assert scheduler.state()["small"]["rejected"] == 2
+    scheduler.check_capacity(FileType.IMAGE, 0)
+
+
+def test_rate_limit_per_client():
+    scheduler = make_scheduler(burst=2)
+    scheduler.check_rate_limit("a")
+    scheduler.check_rate_limit("a")
+    with pytest.raises(RateLimitedError) as excinfo:
+        scheduler.check_rate_limit("a")
+    assert excinfo.value.status_code == 429
+    assert excinfo.value.retry_after >= 1
+    # Other clients have their own budget
+    scheduler.check_rate_limit("b")
+
+
+def test_idle_buckets_are_evicted():
+    scheduler = make_scheduler(burst=2, rate_per_minute=60)
+    for client in ("a", "b", "c"):
+        scheduler.check_rate_limit(client)
+    # Buckets idle for longer than a full refill are indistinguishable from new ones
+    for bucket in scheduler._buckets.values():
+        bucket.updated -= 5
+    scheduler.check_rate_limit("d")
+    assert list(scheduler._buckets) == ["d"]
+
+
+def test_small_jobs_are_not_serialized_behind_running_ones():
+    scheduler = make_scheduler(concurrency={"small": 4, "medium": 2, "large": 1})
+    release = threading.Event()
+
+    async def run():
+        busy = [
+            asyncio.create_task(scheduler.submit("a", FileType.IMAGE, 0, release.wait, cost=cost))
+            for cost in (60.0, 10.0, 10.0)
+        ]
+        await asyncio.sleep(0.05)
+        started = time.monotonic()
+        await asyncio.gather(*(
+            scheduler.submit("b", FileType.IMAGE, 0, time.sleep, 0.2, cost=1.0) for _ in range(4)
+        ))
+        elapsed = time.monotonic() - started
+        release.set()
+        await asyncio.gather(*busy)
+        return elapsed
+
+    assert asyncio.run(run()) < 0.4
+
+
+def test_cancelled_caller_keeps_slot_until_job_finishes():
+    scheduler = make_scheduler()
+    release = threading.Event()
+
+    async def run():
+        job = asyncio.create_task(scheduler.submit("a", FileType.IMAGE, 0, release.wait, cost=1.0))
+        await asyncio.sleep(0.05)
+        job.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await job
+        # The thread is still running, so the slot stays taken
+        assert scheduler.state()["small"]["running"] == 1
+        release.set()
+        for _ in range(100):
+            if not scheduler.state()["small"]["running"]:
+                break
+            await asyncio.sleep(0.01)
+        assert scheduler.state()["small"]["running"] == 0
+
+    asyncio.run(run())
+
+
+def test_zero_rate_disables_rate_limit():
+    scheduler = make_scheduler(rate_per_minute=0)
+    for _ in range(10):
+        scheduler.check_rate_limit("a")
+
+
+def test_multi_slot_job_holds_all_its_slots():
+    scheduler = make_scheduler(concurrency={"small": 2, "medium": 1, "large": 1})
+    release = threading.Event()
+    order = []
+
+    async def run():
+        wide = asyncio.create_task(scheduler.submit("a", FileType.IMAGE, 0, release.wait, cost=1.0, slots=2))
+        await asyncio.sleep(0.05)
+        assert scheduler.state()["small"]["running"] == 2
+        narrow = asyncio.create_task(scheduler.submit("b", FileType.IMAGE, 0, order.append, "b", cost=1.0))
+        await asyncio.sleep(0.05)
+        assert order == []
+        release.set()
+        await asyncio.gather(wide, narrow)
+        with pytest.raises(ValueError):
+            await scheduler.submit("a", FileType.IMAGE, 0, lambda: None, cost=1.0, slots=3)
+
+    asyncio.run(run())
+    assert order == ["b"]
+    assert scheduler.max_slots(1.0) == 2
+    assert scheduler.state()["small"]["running"] == 0
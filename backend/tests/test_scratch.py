@@ -0,0 +1,101 @@
+"""Tests for scratch space reservations and orphan sweeping."""
+import os
+import subprocess
+import sys
+import time
+import pytest
+from app.utils.scratch import HOSTNAME, SCRATCH_PREFIX, InsufficientSpaceError, ScratchManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return ScratchManager(
+        disk_dir=tmp_path / "disk",
+        tmpfs_dir=tmp_path / "shm",
+        tmpfs_max_job_bytes=1000,
+        tmpfs_max_bytes=1500,
+        space_factor=2.0,
+        min_free_bytes=0,
+        orphan_age=3600,
+    )
+
+
+def reserved(manager):
+    return {root: state["reserved"] for root, state in manager.state().items()}
+
+
+def dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_small_jobs_use_tmpfs_until_its_budget_is_spent(manager):
+    first = manager.acquire(400)
+    assert first.parent == manager.tmpfs_dir
+    # 800 + 800 exceeds the 1500 byte tmpfs budget
+    second = manager.acquire(400)
+    assert second.parent == manager.disk_dir
+    assert reserved(manager) == {str(manager.disk_dir): 800, str(manager.tmpfs_dir): 800}
+
+    manager.release(first)
+    manager.release(second)
+    assert not first.exists() and not second.exists()
+    assert reserved(manager) == {str(manager.disk_dir): 0, str(manager.tmpfs_dir): 0}
+
+
+def test_large_jobs_go_to_disk(manager):
+    path = manager.acquire(600)
+    assert path.parent == manager.disk_dir
+    manager.release(path)
+
+
+def test_rejects_when_disk_would_fill(manager):
+    manager.min_free_bytes = 1 << 62
+    with pytest.raises(InsufficientSpaceError) as excinfo:
+        manager.acquire(600)
+    assert excinfo.value.status_code == 507
+    assert set(reserved(manager).values()) == {0}
+    assert list(manager.disk_dir.iterdir()) == []
+
+
+def test_workspace_releases_on_error(manager):
+    with pytest.raises(RuntimeError):
+        with manager.workspace(100) as path:
+            (path / "partial").write_bytes(b"x")
+            raise RuntimeError("boom")
+    assert not path.exists()
+    assert set(reserved(manager).values()) == {0}
+
+
+def test_sweep_removes_orphans_only(manager, tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    old = time.time() - 7200
+
+    def entry(directory, name, age=None, is_dir=False):
+        path = directory / name
+        if is_dir:
+            path.mkdir()
+            (path / "file").write_bytes(b"x")
+        else:
+            path.write_bytes(b"x")
+        if age is not None:
+            os.utime(path, (age, age))
+        return path
+
+    dead = entry(manager.disk_dir, f"{SCRATCH_PREFIX}{HOSTNAME}_{dead_pid()}_job", is_dir=True)
+    own = entry(manager.tmpfs_dir, f"{SCRATCH_PREFIX}{HOSTNAME}_{os.getpid()}_job")
+    live = entry(manager.disk_dir, f"{SCRATCH_PREFIX}{HOSTNAME}_{os.getppid()}_job", age=old)
+    other_host_new = entry(manager.disk_dir, f"{SCRATCH_PREFIX}elsewhere_1_job")
+    other_host_old = entry(manager.disk_dir, f"{SCRATCH_PREFIX}elsewhere_2_job", age=old)
+    stray_old = entry(manager.disk_dir, "leftover.tmp", age=old)
+    stray_new = entry(manager.disk_dir, "fresh.tmp")
+    data_old = entry(data_dir, "upload.jpg", age=old)
+    data_dead = entry(data_dir, f"{SCRATCH_PREFIX}{HOSTNAME}_{dead_pid()}_upload.jpg")
+
+    assert manager.sweep([data_dir]) == 5
+    for path in (dead, own, other_host_old, stray_old, data_dead):
+        assert not path.exists()
+    for path in (live, other_host_new, stray_new, data_old):
+        assert path.exists()
@@ -0,0 +1,112 @@
+"""Tests for the local and S3 storage backends."""
+import io
+import boto3
+import pytest
+from boto3.s3.transfer import TransferConfig
+from moto import mock_aws
+from app.utils.storage import LocalStorage, S3Storage
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+        monkeypatch.setenv(name, "testing")
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket="test-bucket")
+        yield client
+
+
+@pytest.fixture(params=["local", "s3"])
+def storage(request, tmp_path):
+    if request.param == "local":
+        return LocalStorage(tmp_path / "store")
+    return S3Storage("test-bucket", "uploads/", client=request.getfixturevalue("s3_client"))
+
+
+def test_save_open_delete(storage):
+    assert storage.save("a.txt", io.BytesIO(b"hello")) == 5
+    assert storage.exists("a.txt")
+    assert storage.size("a.txt") == 5
+    with storage.open("a.txt") as f:
+        assert f.read() == b"hello"
+
+    storage.delete("a.txt")
+    assert not storage.exists("a.txt")
+    # Deleting a missing key is not an error
+    storage.delete("a.txt")
+
+
+def test_keys_are_flat(storage):
+    storage.save("../../escape.txt", io.BytesIO(b"data"))
+    assert storage.exists("escape.txt")
+
+
+def test_fetch(storage):
+    storage.save("a.bin", io.BytesIO(b"\x00\x01"))
+    with storage.fetch("a.bin") as path:
+        assert path.read_bytes() == b"\x00\x01"
+        assert path.suffix == ".bin"
+
+
+def test_staging_stores_written_file(storage):
+    with storage.staging("out.jpg") as path:
+        # Encoders pick the format from the extension
+        assert path.suffix == ".jpg"
+        assert not storage.exists("out.jpg")
+        path.write_bytes(b"result")
+    assert storage.size("out.jpg") == 6
+
+
+def test_staging_skips_unwritten_file(storage):
+    with storage.staging("out.jpg"):
+        pass
+    assert not storage.exists("out.jpg")
+
+
+def test_staging_discards_on_error(storage):
+    with pytest.raises(RuntimeError):
+        with storage.staging("out.jpg") as path:
+            path.write_bytes(b"partial")
+            raise RuntimeError("encoder failed")
+    assert not storage.exists("out.jpg")
+
+
+def test_publish(storage, tmp_path):
+    path = tmp_path / "result.webp"
+    path.write_bytes(b"webp")
+    storage.publish("result.webp", path)
+    with storage.open("result.webp") as f:
+        assert f.read() == b"webp"
+
+
+def test_local_paths_and_free_space(tmp_path):
+    storage = LocalStorage(tmp_path / "store")
+    storage.save("a.txt", io.BytesIO(b"x"))
+    assert storage.local_path("a.txt") == tmp_path / "store" / "a.txt"
+    assert storage.download_url("a.txt") is None
+    assert storage.free_bytes() > 0
+    # No temporary files are left next to the stored ones
+    assert [p.name for p in (tmp_path / "store").iterdir()] == ["a.txt"]
+
+
+def test_s3_multipart_upload(s3_client):
+    storage = S3Storage("test-bucket", "uploads/", client=s3_client)
+    storage.transfer_config = TransferConfig(multipart_threshold=5 * MB, multipart_chunksize=5 * MB)
+    data = bytes(range(256)) * (11 * MB // 256)
+    assert storage.save("big.bin", io.BytesIO(data)) == len(data)
+    assert s3_client.head_object(Bucket="test-bucket", Key="uploads/big.bin")["ContentLength"] == len(data)
+    with storage.fetch("big.bin") as path:
+        assert path.read_bytes() == data
+
+
+def test_s3_presigned_download(s3_client):
+    storage = S3Storage("test-bucket", "compressed/", client=s3_client)
+    storage.save("a.jpg", io.BytesIO(b"jpeg"))
+    url = storage.download_url("a.jpg", "a.jpg")
+    assert "test-bucket" in url and "compressed/a.jpg" in url
+    assert "response-content-disposition" in url
+    assert storage.local_path("a.jpg") is None
+    assert storage.free_bytes() is None
@@ -0,0 +1,93 @@
+"""Tests for the compression worker."""
+import io
+import pytest
+from PIL import Image
+from app.models import JobStatus
+from app.services import pipeline, worker
+from app.services.job_queue import Job, SQLiteJobQueue
+from app.services.worker import CompressionWorker
+from app.utils.storage import LocalStorage
+
+
+@pytest.fixture
+def storages(tmp_path, monkeypatch):
+    uploads = LocalStorage(tmp_path / "uploads")
+    outputs = LocalStorage(tmp_path / "compressed")
+    monkeypatch.setattr(worker, "get_upload_storage", lambda: uploads)
+    monkeypatch.setattr(pipeline, "get_output_storage", lambda: outputs)
+    return uploads, outputs
+
+
+def enqueue(queue, uploads, name: str, data: bytes, max_attempts: int = 3) -> Job:
+    uploads.save(name, io.BytesIO(data))
+    return queue.enqueue(Job(
+        file_type="image",
+        input_key=name,
+        output_key=f"compressed_{name}",
+        request={"strategy": "quality", "quality": 50},
+        max_attempts=max_attempts,
+    ))
+
+
+def test_worker_completes_job(tmp_path, storages):
+    uploads, outputs = storages
+    queue = SQLiteJobQueue(tmp_path / "jobs.db")
+    buffer = io.BytesIO()
+    Image.effect_noise((128, 128), 64).convert("RGB").save(buffer, "JPEG", quality=95)
+    job = enqueue(queue, uploads, "photo.jpg", buffer.getvalue())
+
+    assert CompressionWorker(queue, worker_id="w1").run_once()
+    done = queue.get(job.job_id)
+    assert done.status == JobStatus.COMPLETED
+    assert outputs.exists(done.result["filename"])
+    assert done.result["compressed_size"] == outputs.size(done.result["filename"])
+    assert not uploads.exists("photo.jpg")
+    assert not CompressionWorker(queue, worker_id="w1").run_once()
+
+
+def test_failed_job_input_is_kept_for_retries_then_deleted(tmp_path, storages):
+    uploads, _ = storages
+    queue = SQLiteJobQueue(tmp_path / "jobs.db")
+    job = enqueue(queue, uploads, "broken.jpg", b"not an image", max_attempts=2)
+    compression_worker = CompressionWorker(queue, worker_id="w1")
+
+    compression_worker.run_once()
+    assert queue.get(job.job_id).status == JobStatus.PENDING
+    assert uploads.exists("broken.jpg")
+
+    compression_worker.run_once()
+    assert queue.get(job.job_id).status == JobStatus.FAILED
+    assert not uploads.exists("broken.jpg")
+
+
+def test_expired_last_attempt_input_is_deleted(tmp_path, storages):
+    uploads, _ = storages
+    queue = SQLiteJobQueue(tmp_path / "jobs.db")
+    job = enqueue(queue, uploads, "lost.jpg", b"data", max_attempts=1)
+    # A worker that crashed while holding the lease
+    queue.claim("crashed", -1)
+
+    assert not CompressionWorker(queue, worker_id="w1").run_once()
+    assert queue.get(job.job_id).status == JobStatus.FAILED
+    assert not uploads.exists("lost.jpg")
+
+
+def test_worker_that_lost_its_lease_keeps_the_input(tmp_path, storages, monkeypatch):
+    uploads, _ = storages
+    queue = SQLiteJobQueue(tmp_path / "jobs.db")
+    job = enqueue(queue, uploads, "slow.jpg", b"data")
+
+    def process(job):
+        # The lease expires mid-job and another worker takes over
+        queue.requeue_expired()
+        queue.claim("w2", 60)
+        return {"filename": "compressed_slow.jpg"}
+
+    compression_worker = CompressionWorker(queue, worker_id="w1", lease_seconds=-1)
+    monkeypatch.setattr(compression_worker, "_process", process)
+    monkeypatch.setattr(compression_worker, "_heartbeat", lambda job, done: None)
+    compression_worker.run_once()
+    stored = queue.get(job.job_id)
+    assert stored.worker_id == "w2"
+    assert stored.status == JobStatus.RUNNING
+    assert uploads.exists("slow.jpg")
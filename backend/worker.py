@@ -0,0 +1,36 @@
+"""Compression worker entry point."""
+import argparse
+import logging
+import signal
+from app.config import settings
+from app.services.job_queue import get_job_queue
+from app.services.worker import CompressionWorker
+from app.utils.scratch import scratch
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a compression worker")
+    parser.add_argument("--worker-id", help="Identifier reported in job leases")
+    parser.add_argument("--once", action="store_true", help="Process at most one job and exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    # Remove scratch files left behind by processes that crashed mid-job
+    scratch.sweep([settings.UPLOAD_DIR, settings.COMPRESSED_DIR])
+
+    worker = CompressionWorker(get_job_queue(), worker_id=args.worker_id)
+    if args.once:
+        worker.run_once()
+        return
+
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    signal.signal(signal.SIGINT, lambda *_: worker.stop())
+    worker.run_forever()
+
+
+if __name__ == "__main__":
+    main()